@@ -0,0 +1,374 @@
+"""
+Admission control for LLM-bound requests.
+
+Every outbound LLM call runs inside `llm_slot()`, which holds one of LLM_MAX_IN_FLIGHT
+slots. Calls that find no free slot wait in per-priority queues, and within a priority
+the queue is round-robin across clients, so a client with a 100-clause contract gets one
+slot in turn with everyone else instead of all of them. A request also keeps at most
+LLM_MAX_PER_REQUEST calls queued or in flight at once; the rest of its clauses wait on the
+request itself, so one large upload cannot fill the shared queue. Background jobs (batch
+analysis, bulk generation) run under a ticket of their own, capped at LLM_MAX_PER_JOB, so
+the per-request cap does not bound a whole batch. Interactive requests
+(/check_violation, single contract generation) are served ahead of bulk ones (uploads,
+batches). Requests that arrive while the queue is deeper than their class allows are shed
+with 503 and a Retry-After estimated from the queue depth and recent LLM latency.
+"""
+import os
+import math
+import time
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager, asynccontextmanager
+from collections import OrderedDict, deque
+from flask import Blueprint, request, jsonify
+
+admission_bp = Blueprint("admission", __name__)
+
+# ====== Configuration ======
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+# LLM calls one request may have queued or in flight; its other clauses wait their turn without counting as queued
+LLM_MAX_PER_REQUEST = int(os.getenv("LLM_MAX_PER_REQUEST", "4"))
+# The same for one background job; sized for the batch worker pools (BATCH_LLM_WORKERS)
+LLM_MAX_PER_JOB = int(os.getenv("LLM_MAX_PER_JOB", "8"))
+# Queued LLM calls beyond which new requests of each class are turned away; bulk is shed first
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_MAX_QUEUE_BULK = int(os.getenv("ADMISSION_MAX_QUEUE_BULK", "16"))
+# Longest a single LLM call may wait for a slot once its request was admitted
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "120"))
+# Reverse proxies in front of the server that append to X-Forwarded-For; 0 trusts no forwarding header
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+# View functions whose requests fan out into many LLM calls
+BULK_VIEWS = {"upload_contract", "batch_analysis", "bulk_generate"}
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"LLM capacity exhausted, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """Admission state of one request: who is asking, at what priority, and how long its LLM calls queued."""
+
+    def __init__(self, client, priority, max_calls=None):
+        self.client = client
+        self.priority = priority
+        self.started = time.perf_counter()
+        self.queue_wait = 0.0  # seconds, summed over the request's LLM calls
+        self.llm_calls = 0
+        self.max_calls = max_calls
+        self._lock = threading.Lock()
+        self._gate = threading.BoundedSemaphore(max_calls) if max_calls else None
+        self._async_gate = None  # created on first use, inside the event loop
+
+    def add_call(self, waited):
+        with self._lock:
+            self.queue_wait += waited
+            self.llm_calls += 1
+
+    @contextmanager
+    def turn(self):
+        """Hold one of this request's max_calls call slots (unlimited when max_calls is None)."""
+        if self._gate is None:
+            yield
+            return
+        with self._gate:
+            yield
+
+    @asynccontextmanager
+    async def aturn(self):
+        """turn() for coroutines."""
+        if not self.max_calls:
+            yield
+            return
+        if self._async_gate is None:
+            self._async_gate = asyncio.Semaphore(self.max_calls)
+        async with self._async_gate:
+            yield
+
+    def timings(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "queue_wait_ms": round(self.queue_wait * 1000, 1),
+            "processing_ms": round(max(elapsed - self.queue_wait, 0.0) * 1000, 1),
+            "llm_calls": self.llm_calls,
+        }
+
+
+_BACKGROUND = Ticket("background", BULK)
+_current = contextvars.ContextVar("admission_ticket", default=None)
+
+
+def current_ticket():
+    return _current.get()
+
+
+def use_ticket(ticket):
+    """Make `ticket` the current request's ticket (None clears it)."""
+    _current.set(ticket)
+
+
+def job_ticket():
+    """Ticket for a background job started by the current request: same client, bulk priority, LLM_MAX_PER_JOB calls."""
+    ticket = _current.get()
+    return Ticket(ticket.client if ticket else "background", BULK, LLM_MAX_PER_JOB)
+
+
+def bind(fn, ticket=None):
+    """Wrap `fn` so it runs under `ticket` (default: the current request's) on another thread (executors, background jobs)."""
+    ticket = ticket or _current.get()
+
+    def run(*args, **kwargs):
+        token = _current.set(ticket)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+
+class _AsyncGrant:
+    """Queue entry for a coroutine waiting on a slot; like threading.Event, set() may be called from any thread."""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+        self._set = False
+
+    def set(self):
+        self._set = True
+        self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+    def is_set(self):
+        return self._set
+
+
+class LLMScheduler:
+    def __init__(self, max_in_flight):
+        self.max_in_flight = max(1, max_in_flight)
+        self.stats = {"admitted": 0, "queued": 0, "shed": 0, "timed_out": 0}
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._depth = 0
+        self._waiting = {INTERACTIVE: OrderedDict(), BULK: OrderedDict()}  # priority -> client -> deque of events
+        self._latency = 5.0  # moving average of LLM call duration, seconds
+
+    def queue_depth(self):
+        with self._lock:
+            return self._depth
+
+    def record_shed(self):
+        with self._lock:
+            self.stats["shed"] += 1
+
+    def retry_after(self):
+        with self._lock:
+            return self._retry_after()
+
+    def _retry_after(self):
+        return max(1, math.ceil((self._depth + 1) * self._latency / self.max_in_flight))
+
+    def _enqueue(self, ticket, make_grant):
+        """Take a free slot (returns None) or queue a new grant for `ticket` and return it."""
+        with self._lock:
+            if self._in_flight < self.max_in_flight and not self._depth:
+                self._in_flight += 1
+                self.stats["admitted"] += 1
+                return None
+            granted = make_grant()
+            self._waiting[ticket.priority].setdefault(ticket.client, deque()).append(granted)
+            self._depth += 1
+            self.stats["queued"] += 1
+            return granted
+
+    def _withdraw(self, ticket, granted):
+        """Take a waiter out of the queue; returns False if it was granted a slot in the meantime."""
+        with self._lock:
+            if granted.is_set():
+                return False
+            clients = self._waiting[ticket.priority]
+            clients[ticket.client].remove(granted)
+            if not clients[ticket.client]:
+                del clients[ticket.client]
+            self._depth -= 1
+            return True
+
+    def _timed_out(self, ticket, granted):
+        if self._withdraw(ticket, granted):
+            with self._lock:
+                self.stats["timed_out"] += 1
+                raise Overloaded(self._retry_after())
+
+    def acquire(self, ticket):
+        """Block until a slot is granted to `ticket`. Returns seconds waited; raises Overloaded on timeout."""
+        granted = self._enqueue(ticket, threading.Event)
+        if granted is None:
+            return 0.0
+        started = time.perf_counter()
+        if not granted.wait(ADMISSION_MAX_WAIT):
+            self._timed_out(ticket, granted)
+        return time.perf_counter() - started
+
+    async def acquire_async(self, ticket):
+        """acquire() for coroutines: waiting holds no thread."""
+        granted = self._enqueue(ticket, _AsyncGrant)
+        if granted is None:
+            return 0.0
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(granted.future), ADMISSION_MAX_WAIT)
+        except asyncio.TimeoutError:
+            self._timed_out(ticket, granted)
+        except asyncio.CancelledError:
+            # The client went away: leave the queue, or pass on a slot granted in the meantime
+            if not self._withdraw(ticket, granted):
+                self.release(time.perf_counter() - started)
+            raise
+        return time.perf_counter() - started
+
+    def release(self, duration):
+        """Free a slot, handing it straight to the next waiter: highest priority first, round-robin across clients."""
+        with self._lock:
+            self._latency = 0.8 * self._latency + 0.2 * duration
+            for priority in (INTERACTIVE, BULK):
+                clients = self._waiting[priority]
+                if clients:
+                    client, queue = next(iter(clients.items()))
+                    granted = queue.popleft()
+                    if queue:
+                        clients.move_to_end(client)
+                    else:
+                        del clients[client]
+                    self._depth -= 1
+                    self.stats["admitted"] += 1
+                    granted.set()
+                    return
+            self._in_flight -= 1
+
+    def report(self):
+        with self._lock:
+            return {
+                **self.stats,
+                "in_flight": self._in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queue_depth": self._depth,
+                "queued_by_priority": {PRIORITY_NAMES[p]: sum(len(q) for q in clients.values()) for p, clients in self._waiting.items()},
+                "avg_llm_seconds": round(self._latency, 2),
+            }
+
+
+scheduler = LLMScheduler(LLM_MAX_IN_FLIGHT)
+
+
+@contextmanager
+def llm_slot():
+    """Hold one in-flight LLM slot for the duration of the block, queueing fairly if none is free."""
+    ticket = _current.get() or _BACKGROUND
+    with ticket.turn():
+        ticket.add_call(scheduler.acquire(ticket))
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            scheduler.release(time.perf_counter() - started)
+
+
+@asynccontextmanager
+async def allm_slot():
+    """llm_slot() for coroutines."""
+    ticket = _current.get() or _BACKGROUND
+    async with ticket.aturn():
+        ticket.add_call(await scheduler.acquire_async(ticket))
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            scheduler.release(time.perf_counter() - started)
+
+
+# ====== Request Hooks ======
+def client_id(headers, remote_addr):
+    """
+    Fairness key: the peer address.
+
+    Behind TRUSTED_PROXY_HOPS proxies it is the address the outermost trusted proxy saw,
+    read from the right of X-Forwarded-For as werkzeug's ProxyFix does, so a client cannot
+    pick its own key by sending the header. Client-supplied ids are not used since requests
+    are not authenticated.
+    """
+    if TRUSTED_PROXY_HOPS:
+        forwarded = [hop.strip() for hop in headers.get("X-Forwarded-For", "").split(",") if hop.strip()]
+        if len(forwarded) >= TRUSTED_PROXY_HOPS:
+            return forwarded[-TRUSTED_PROXY_HOPS]
+    return remote_addr or "anonymous"
+
+
+def admit(endpoint, client):
+    """Ticket for a new LLM-bound request; raises Overloaded when the request's class is being shed."""
+    view = (endpoint or "").rsplit(".", 1)[-1]
+    priority = BULK if view in BULK_VIEWS else INTERACTIVE
+    limit = ADMISSION_MAX_QUEUE_BULK if priority == BULK else ADMISSION_MAX_QUEUE
+    if scheduler.queue_depth() >= limit:
+        scheduler.record_shed()
+        raise Overloaded(scheduler.retry_after())
+    return Ticket(client, priority, LLM_MAX_PER_REQUEST)
+
+
+def timing_headers(ticket):
+    timings = ticket.timings()
+    return {
+        "X-Queue-Wait-Ms": str(timings["queue_wait_ms"]),
+        "X-Processing-Ms": str(timings["processing_ms"]),
+        "X-Priority": PRIORITY_NAMES[ticket.priority],
+    }
+
+
+def _admit():
+    _current.set(None)
+    if request.method != "POST":
+        return None
+    try:
+        ticket = admit(request.endpoint, client_id(request.headers, request.remote_addr))
+    except Overloaded as e:
+        return _busy(e.retry_after)
+    _current.set(ticket)
+    return None
+
+
+def _report_timings(response):
+    ticket = _current.get()
+    if ticket is not None:
+        response.headers.update(timing_headers(ticket))
+    return response
+
+
+def _busy(retry_after):
+    response = jsonify({"error": "Server is busy, please retry later.", "retry_after": retry_after})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def _overloaded(e):
+    return _busy(e.retry_after)
+
+
+def install(blueprint):
+    """Put a blueprint's POST endpoints behind admission control."""
+    blueprint.before_request(_admit)
+    blueprint.after_request(_report_timings)
+    blueprint.register_error_handler(Overloaded, _overloaded)
+
+
+@admission_bp.route("/stats", methods=["GET"])
+def admission_stats():
+    return jsonify(scheduler.report())
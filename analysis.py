@@ -0,0 +1,649 @@
+import os
+import json
+import numpy as np
+import torch
+from flask import Blueprint, request, jsonify
+from transformers import AutoTokenizer, AutoModel
+from dotenv import load_dotenv
+from pdftext import extract_pdf_text
+from llmjson import call_llm_json, VIOLATION_SCHEMA, RISK_SCHEMA, CLAUSES_SCHEMA, COMBINED_SCHEMA
+from verdictgate import VerdictGate, SKIP_UNMATCHED_CLAUSES, count, record_verdict
+from revisions import align, analysis_store
+from admission import Overloaded
+
+load_dotenv()
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+analysis_bp = Blueprint("analysis", __name__)
+
+if not os.getenv("OPENROUTER_API_KEY"):
+    print("Warning: OPENROUTER_API_KEY is not set. The application will not work properly.")
+
+# ====== InLegalBERT (shared by the risk and compliance analyses) ======
+embedding_model_id = "law-ai/InLegalBERT"
+embedding_tokenizer = AutoTokenizer.from_pretrained(embedding_model_id)
+embedding_model = AutoModel.from_pretrained(embedding_model_id)
+EMBEDDING_BATCH_SIZE = 32
+
+def embed_batch(texts, batch_size=EMBEDDING_BATCH_SIZE):
+    """Embed many texts in padded batches; mean-pools real tokens only, so padding does not change a text's vector."""
+    vectors = []
+    for i in range(0, len(texts), batch_size):
+        inputs = embedding_tokenizer(texts[i:i + batch_size], return_tensors="pt", truncation=True, padding=True, max_length=512)
+        with torch.no_grad():
+            hidden = embedding_model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"].unsqueeze(-1).float()
+        vectors.append(((hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)).numpy())
+    return np.concatenate(vectors) if vectors else np.zeros((0, embedding_model.config.hidden_size), dtype=np.float32)
+
+# ====== Legal Rules ======
+SIMILARITY_THRESHOLD = 0.6
+NO_RELEVANT_RULE = {"law_text": "No sufficiently relevant legal rule found."}
+
+def load_legal_rules():
+    try:
+        # Get the path to the JSON file in the same directory
+        json_file_path = os.path.join(os.path.dirname(__file__), 'extracted_text_laws.json')
+        with open(json_file_path, 'r') as file:
+            data = json.load(file)
+        return data.get('legal_rules', [])
+    except Exception as e:
+        print(f"Error loading legal rules from JSON file: {e}")
+        # Return empty list as fallback in case of error
+        return []
+
+# Rules the compliance analysis matches against, scraped from the MHA website
+compliance_legal_rules = load_legal_rules()
+print(f"Loaded {len(compliance_legal_rules)} legal rules from JSON file")
+
+# Rules the risk analysis matches against
+risk_legal_rules = [
+    # Civil Laws
+    {"law_id": "CIVIL-001", "category": "Civil Law", "law_text": "Under the Limitation Act, 1963, a person must file a civil suit within the prescribed time limit, failing which the case is dismissed."},
+    {"law_id": "CIVIL-002", "category": "Civil Law", "law_text": "Under the Indian Contract Act, 1872, a valid contract requires an offer, acceptance, consideration, and lawful object."},
+    {"law_id": "CIVIL-003", "category": "Civil Law", "law_text": "As per the Specific Relief Act, 1963, a party can seek specific performance of a contract if damages are inadequate."},
+    {"law_id": "CIVIL-004", "category": "Civil Law", "law_text": "Under the Easements Act, 1882, a person acquires the right to use another's property under specific conditions over a period of time."},
+    {"law_id": "CIVIL-005", "category": "Civil Law", "law_text": "The Transfer of Property Act, 1882, governs the transfer of property by sale, mortgage, lease, gift, or exchange."},
+    {"law_id": "CIVIL-006", "category": "Civil Law", "law_text": "The Registration Act, 1908, mandates the compulsory registration of certain property documents to prevent fraud."},
+
+    # Common Laws
+    {"law_id": "COMMON-001", "category": "Common Law", "law_text": "Under the Indian Penal Code (IPC), 1860, Section 299 defines culpable homicide and its punishments."},
+    {"law_id": "COMMON-002", "category": "Common Law", "law_text": "As per the Criminal Procedure Code (CrPC), 1973, an accused person has the right to legal representation and a fair trial."},
+    {"law_id": "COMMON-003", "category": "Common Law", "law_text": "Under the Evidence Act, 1872, only admissible evidence can be considered in court proceedings."},
+    {"law_id": "COMMON-004", "category": "Common Law", "law_text": "Under the Negotiable Instruments Act, 1881, dishonoring a cheque is a criminal offense."},
+     # Wage-related Laws
+    {"law_id": "WAGE-001", "category": "Wage Law", "law_text": "The Minimum Wages Act, 1948, ensures that workers receive a statutory minimum wage set by the government."},
+    {"law_id": "WAGE-002", "category": "Wage Law", "law_text": "The Payment of Wages Act, 1936, mandates timely payment of wages to employees without unauthorized deductions."},
+    {"law_id": "WAGE-003", "category": "Wage Law", "law_text": "The Equal Remuneration Act, 1976, ensures that men and women receive equal pay for equal work."},
+    {"law_id": "WAGE-004", "category": "Wage Law", "law_text": "The Code on Wages, 2019, consolidates minimum wages, payment of wages, and bonus laws under a single framework."},
+    {"law_id": "WAGE-005", "category": "Wage Law", "law_text": "The Payment of Bonus Act, 1965, mandates that eligible employees receive an annual bonus based on company profits."},
+    
+    # House Agreement Laws
+    {"law_id": "HOUSE-001", "category": "Property Law", "law_text": "Under the Transfer of Property Act, 1882, property agreements must be legally registered if they exceed a value threshold."},
+    {"law_id": "HOUSE-002", "category": "Property Law", "law_text": "The Registration Act, 1908, mandates that property agreements over 12 months must be registered with the sub-registrar."},
+    {"law_id": "HOUSE-003", "category": "Property Law", "law_text": "The Indian Stamp Act, 1899, requires that house agreements be stamped with the appropriate duty as per state laws."},
+    {"law_id": "HOUSE-004", "category": "Property Law", "law_text": "Under the Contract Act, 1872, house agreements must include lawful consideration, offer, acceptance, and legal purpose."},
+
+    # Rent Agreement Laws
+    {"law_id": "RENT-001", "category": "Rent Law", "law_text": "The Rent Control Act, applicable in various states, regulates rent prices and eviction procedures for tenants."},
+    {"law_id": "RENT-002", "category": "Rent Law", "law_text": "The Model Tenancy Act, 2021, provides a legal framework for renting agreements and dispute resolution."},
+    {"law_id": "RENT-003", "category": "Rent Law", "law_text": "Under the Maharashtra Rent Control Act, 1999, landlords must not evict tenants without legal grounds."},
+    {"law_id": "RENT-004", "category": "Rent Law", "law_text": "Under the Delhi Rent Control Act, 1958, rent hikes cannot exceed a fixed percentage unless mutually agreed upon."},
+    {"law_id": "RENT-005", "category": "Rent Law", "law_text": "A rental agreement for over 11 months requires registration under the Registration Act, 1908, to be legally enforceable."},
+    # Customary Laws
+    {"law_id": "CUSTOM-001", "category": "Customary Law", "law_text": "Under the Hindu Succession Act, 1956, ancestral property is inherited by legal heirs, with equal rights to male and female heirs."},
+    {"law_id": "CUSTOM-002", "category": "Customary Law", "law_text": "As per the Muslim Personal Law (Shariat) Application Act, 1937, inheritance and marriage are governed by Islamic principles."},
+    {"law_id": "CUSTOM-003", "category": "Customary Law", "law_text": "The Parsi Marriage and Divorce Act, 1936, dictates marriage and divorce regulations specific to the Parsi community."},
+
+    # Corporate Laws
+    {"law_id": "COMP-001", "category": "Corporate Law", "law_text": "Under the Companies Act, 2013, all companies must register with the Ministry of Corporate Affairs and adhere to governance regulations."},
+    {"law_id": "COMP-002", "category": "Corporate Law", "law_text": "As per the SEBI Act, 1992, all listed companies must follow market regulations to prevent insider trading."},
+    {"law_id": "COMP-003", "category": "Corporate Law", "law_text": "The LLP Act, 2008, provides a legal framework for limited liability partnerships in India."},
+    {"law_id": "COMP-004", "category": "Corporate Law", "law_text": "The Competition Act, 2002, prevents monopolies and promotes fair competition in markets."},
+
+    # IT & Data Privacy Laws
+    {"law_id": "IT-001", "category": "IT Act", "law_text": "Under Section 43A of the IT Act, any corporate body handling personal data must ensure data protection. Failure to do so results in liability."},
+    {"law_id": "DATA-001", "category": "Data Privacy", "law_text": "The Personal Data Protection Bill requires organizations to obtain explicit consent before collecting personal data."},
+    {"law_id": "CYBER-001", "category": "Cyber Law", "law_text": "Under the IT Act, 2000, cyber fraud, hacking, and identity theft are punishable offenses."},
+
+    # Labour Laws
+    {"law_id": "LABOUR-001", "category": "Labour Law", "law_text": "The Minimum Wages Act, 1948, ensures workers receive a statutory minimum wage."},
+    {"law_id": "LABOUR-002", "category": "Labour Law", "law_text": "According to the Industrial Disputes Act, no worker can be terminated without a 30-day notice period."},
+    {"law_id": "LABOUR-003", "category": "Labour Law", "law_text": "Under the Factories Act, 1948, factory workers must have safe working conditions, proper sanitation, and regulated working hours."},
+    {"law_id": "LABOUR-004", "category": "Labour Law", "law_text": "The Maternity Benefit Act, 1961, provides maternity leave and related benefits to women employees."},
+    {"law_id": "LABOUR-005", "category": "Labour Law", "law_text": "The Employees' Provident Fund Act, 1952, ensures retirement benefits for employees through a contributory fund."},
+
+    # Consumer Protection Laws
+    {"law_id": "CONSUMER-001", "category": "Consumer Law", "law_text": "The Consumer Protection Act, 2019, provides rights to consumers against unfair trade practices and defective products."},
+    {"law_id": "CONSUMER-002", "category": "Consumer Law", "law_text": "Under the Food Safety and Standards Act, 2006, food manufacturers must meet safety and hygiene standards."},
+
+    # Environmental Laws
+    {"law_id": "ENV-001", "category": "Environmental Law", "law_text": "The Environment Protection Act, 1986, empowers the central government to protect and improve the environment."},
+    {"law_id": "ENV-002", "category": "Environmental Law", "law_text": "Under the Wildlife Protection Act, 1972, the killing and trade of protected animal species are illegal."},
+    {"law_id": "ENV-003", "category": "Environmental Law", "law_text": "The Water (Prevention and Control of Pollution) Act, 1974, aims to control water pollution."},
+    {"law_id": "ENV-004", "category": "Environmental Law", "law_text": "The Air (Prevention and Control of Pollution) Act, 1981, regulates air pollution control measures."},
+
+    # Banking & Finance Laws
+    {"law_id": "BANK-001", "category": "Banking Law", "law_text": "The Banking Regulation Act, 1949, regulates banking operations and ensures compliance with RBI norms."},
+    {"law_id": "BANK-002", "category": "Banking Law", "law_text": "The SARFAESI Act, 2002, allows banks to recover bad loans without court intervention."},
+    {"law_id": "BANK-003", "category": "Banking Law", "law_text": "The FEMA Act, 1999, governs foreign exchange transactions and regulates cross-border investments."},
+
+    # Real Estate Laws
+    {"law_id": "REAL-001", "category": "Real Estate Law", "law_text": "The RERA Act, 2016, regulates the real estate sector and protects homebuyers from fraud."},
+    {"law_id": "REAL-002", "category": "Real Estate Law", "law_text": "The Benami Transactions Act, 1988, prohibits the holding of property under a fictitious name to avoid taxes."}
+]
+
+class RuleIndex:
+    """Rule embeddings kept L2-normalised, so matching a whole batch of clauses is one matrix product."""
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.embeddings = embed_batch([rule['law_text'] for rule in rules])
+        self._unit = self.embeddings / np.linalg.norm(self.embeddings, axis=1, keepdims=True).clip(min=1e-12)
+
+    def best_matches(self, clause_embeddings):
+        """Returns (best rule index, cosine similarity) arrays, one entry per clause."""
+        if not self.rules or len(clause_embeddings) == 0:
+            return np.zeros(len(clause_embeddings), dtype=int), np.full(len(clause_embeddings), -1.0)
+        unit = clause_embeddings / np.linalg.norm(clause_embeddings, axis=1, keepdims=True).clip(min=1e-12)
+        similarities = unit @ self._unit.T
+        best = similarities.argmax(axis=1)
+        return best, similarities[np.arange(len(best)), best]
+
+compliance_index = RuleIndex(compliance_legal_rules)
+risk_index = RuleIndex(risk_legal_rules)
+
+compliance_gate = VerdictGate.load("compliance")
+risk_gate = VerdictGate.load("risk")
+
+# ====== Parsing & Segmentation ======
+def extract_text(pdf_file):
+    return extract_pdf_text(pdf_file.read())
+
+def split_clauses(contract_text):
+    """Local sentence-level segmentation, no LLM call."""
+    return [cl.strip() for cl in contract_text.split(".") if len(cl.strip()) > 20]
+
+# Output-token budgets per prompt; the JSON reader stops earlier once the object is complete
+# Clause extraction restates the contract, so its budget follows the contract's length (about 3 characters per token)
+CLAUSE_EXTRACTION_MIN_TOKENS = 2048
+CLAUSE_EXTRACTION_MAX_TOKENS = int(os.getenv("CLAUSE_EXTRACTION_MAX_TOKENS", "32000"))
+VIOLATION_MAX_TOKENS = 150
+RISK_MAX_TOKENS = 400
+COMBINED_MAX_TOKENS = 450
+
+def clause_extraction_prompt(contract_text):
+    return f"""
+        Extract all key legal clauses from the following contract text.
+        Return only a JSON object in this format:
+        {{ "clauses": ["Clause 1", "Clause 2"] }}
+
+        Contract Text:
+        {contract_text}
+        """
+
+def clause_extraction_budget(contract_text):
+    return min(CLAUSE_EXTRACTION_MAX_TOKENS, max(CLAUSE_EXTRACTION_MIN_TOKENS, len(contract_text) // 3 + 512))
+
+def extract_clauses_llm(contract_text):
+    """LLM-based segmentation into key legal clauses. Returns ({"clauses": [...]}, error)."""
+    try:
+        parsed, _ = call_llm_json(clause_extraction_prompt(contract_text), CLAUSES_SCHEMA, clause_extraction_budget(contract_text))
+        if parsed is None:
+            return None, "Failed to parse AI response."
+        return parsed, None
+    except Overloaded:
+        raise
+    except Exception as e:
+        return None, str(e)
+
+# ====== Shared Intermediate Results ======
+def prepare(clauses):
+    """
+    Embed every distinct clause once and match it against both rule sets.
+
+    Returns one context dict per distinct clause with its embedding and, for each
+    analysis, (rule, similarity, rule index). The compliance index is None when no
+    rule clears SIMILARITY_THRESHOLD.
+    """
+    clauses = list(dict.fromkeys(clauses))
+    embeddings = embed_batch(clauses)
+    compliance_best, compliance_sims = compliance_index.best_matches(embeddings)
+    risk_best, risk_sims = risk_index.best_matches(embeddings)
+
+    contexts = []
+    for i, clause in enumerate(clauses):
+        if compliance_sims[i] >= SIMILARITY_THRESHOLD:
+            compliance_match = (compliance_legal_rules[compliance_best[i]], float(compliance_sims[i]), int(compliance_best[i]))
+        else:
+            compliance_match = (NO_RELEVANT_RULE, float(compliance_sims[i]), None)
+        risk_match = (risk_legal_rules[risk_best[i]], float(risk_sims[i]), int(risk_best[i])) if risk_legal_rules else (NO_RELEVANT_RULE, 0.0, None)
+        contexts.append({"clause": clause, "embedding": embeddings[i], "compliance": compliance_match, "risk": risk_match})
+    return contexts
+
+# LLM judgments are planned as requests, (prompt, schema, max_tokens, finish), where
+# finish(parsed, response_text) returns {task: result}. judge_clause runs them with
+# call_llm_json; the async server (asgi.py) runs the same requests with acall_llm_json.
+
+# ====== Compliance Judgment ======
+def _compliance_local(ctx):
+    """Verdict without the LLM (no relevant rule, or a confident gate), else None."""
+    clause = ctx["clause"]
+    rule, similarity, index = ctx["compliance"]
+    if index is None and SKIP_UNMATCHED_CLAUSES:
+        count("compliance", "skipped")
+        return {
+            "Clause": clause,
+            "Legal Rule": rule['law_text'],
+            "Violates": "NOT_APPLICABLE",
+            "Reason": "No legal rule in the database is relevant to this clause."
+        }
+    if compliance_gate is not None and index is not None:
+        prediction = compliance_gate.predict(ctx["embedding"], compliance_index.embeddings[index], similarity)
+        if prediction is not None:
+            label, confidence = prediction
+            count("compliance", "gated")
+            return {
+                "Clause": clause,
+                "Legal Rule": rule['law_text'],
+                "Violates": label,
+                "Reason": f"Classified by the local verdict model ({confidence:.0%} confidence)."
+            }
+    return None
+
+def _compliance_result(ctx, violates, reason, response_text):
+    clause = ctx["clause"]
+    rule, similarity, index = ctx["compliance"]
+    if not response_text:
+        return {"Clause": clause, "Legal Rule": rule['law_text'], "Violates": "UNKNOWN", "Reason": "LLM inference failed"}
+    if violates is None:
+        return {
+            "Clause": clause,
+            "Legal Rule": rule['law_text'],
+            "Violates": "UNKNOWN",
+            "Reason": "Could not parse LLM response: " + response_text[:200] + ("..." if len(response_text) > 200 else "")
+        }
+    verdict = violates.strip().upper()
+    if index is not None and verdict in ("YES", "NO"):
+        record_verdict("compliance", clause, rule['law_text'], similarity, verdict)
+    return {"Clause": clause, "Legal Rule": rule['law_text'], "Violates": violates, "Reason": reason}
+
+def _compliance_llm(ctx):
+    count("compliance", "llm_calls")
+    clause = ctx["clause"]
+    rule = ctx["compliance"][0]
+    reasoning_prompt = f"""
+    As an Indian legal expert, analyze the following contract clause in relation to the specified legal rule. Determine if the clause violates the rule and explain your reasoning.
+
+    Clause: "{clause}"
+    Legal Rule: "{rule['law_text']}"
+
+    Provide your answer as a single JSON object and nothing else:
+    {{
+        "Violates": "YES or NO",
+        "Reason": "<brief reasoning, at most two sentences>"
+    }}
+    """
+
+    def finish(parsed, response_text):
+        if parsed is None:
+            return {"compliance": _compliance_result(ctx, None, None, response_text)}
+        return {"compliance": _compliance_result(ctx, parsed["Violates"], parsed["Reason"], response_text)}
+    return reasoning_prompt, VIOLATION_SCHEMA, VIOLATION_MAX_TOKENS, finish
+
+# ====== Risk Judgment ======
+def _risk_label(result):
+    """Training label for a risk verdict: the single category the LLM put the clause in, else None."""
+    filled = [key for key in ("good_clauses", "risk_clauses", "recommendations") if result.get(key)]
+    return {"good_clauses": "good", "risk_clauses": "risk", "recommendations": "recommendation"}[filled[0]] if len(filled) == 1 else None
+
+def _risk_local(ctx):
+    # Recommendations need a suggested rewrite, so only good/risk verdicts can be answered locally
+    rule, similarity, index = ctx["risk"]
+    if risk_gate is None or index is None:
+        return None
+    prediction = risk_gate.predict(ctx["embedding"], risk_index.embeddings[index], similarity)
+    if prediction is None or prediction[0] not in ("good", "risk"):
+        return None
+    label, confidence = prediction
+    count("risk", "gated")
+    reason = f"Classified by the local verdict model ({confidence:.0%} confidence) against: {rule['law_text']}"
+    if label == "good":
+        return {"good_clauses": [{"clause": ctx["clause"], "reason": reason}]}
+    return {"risk_clauses": [{"clause": ctx["clause"], "risk": reason}]}
+
+RISK_PARSE_FAILURE = "Could not parse AI response"
+
+def _risk_result(ctx, parsed, response_text):
+    if parsed is None:
+        return {"risk_clauses": [{"clause": ctx["clause"], "risk": f"{RISK_PARSE_FAILURE}: {response_text}"}], "failed": True}
+    rule, similarity, index = ctx["risk"]
+    label = _risk_label(parsed)
+    if label and index is not None:
+        record_verdict("risk", ctx["clause"], rule['law_text'], similarity, label)
+    return parsed
+
+def _risk_llm(ctx):
+    count("risk", "llm_calls")
+    clause = ctx["clause"]
+    legal_rule = ctx["risk"][0]['law_text']
+    prompt = f"""
+    You are a legal analyst. Given the following clause and legal rule, return a JSON object categorizing it as one of the following:
+    - good_clauses: Clauses that are beneficial and well-written.
+    - risk_clauses: Clauses that pose legal or fairness risks.
+    - recommendations: Clauses that are acceptable but could be improved. Include a 'suggested_rewrite'.
+
+    Return only the JSON object. Keep each reason to one sentence. Format:
+    {{
+        "good_clauses": [{{ "clause": "...", "reason": "..." }}],
+        "risk_clauses": [{{ "clause": "...", "risk": "..." }}],
+        "recommendations": [{{ "clause": "...", "reason": "...", "suggested_rewrite": "..." }}]
+    }}
+
+    Clause: "{clause}"
+    Legal Rule: "{legal_rule}"
+    """
+
+    def finish(parsed, response_text):
+        return {"risk": _risk_result(ctx, parsed, response_text)}
+    return prompt, RISK_SCHEMA, RISK_MAX_TOKENS, finish
+
+# ====== Combined Judgment ======
+def _combined_llm(ctx):
+    """One prompt answering both the compliance and the risk question for a clause."""
+    count("compliance", "llm_calls")
+    count("risk", "llm_calls")
+    clause = ctx["clause"]
+    compliance_rule = ctx["compliance"][0]['law_text']
+    risk_rule = ctx["risk"][0]['law_text']
+    prompt = f"""
+    As an Indian legal expert, assess the following contract clause in two ways.
+    1. Compliance: does the clause violate Legal Rule A?
+    2. Risk: in light of Legal Rule B, is the clause "good" (beneficial and well-written), "risk" (poses legal or fairness risks) or "recommendation" (acceptable but could be improved)?
+
+    Clause: "{clause}"
+    Legal Rule A: "{compliance_rule}"
+    Legal Rule B: "{risk_rule}"
+
+    Provide your answer as a single JSON object and nothing else:
+    {{
+        "Violates": "YES or NO",
+        "Reason": "<brief compliance reasoning, at most two sentences>",
+        "category": "good, risk or recommendation",
+        "note": "<one sentence explaining the risk category>",
+        "suggested_rewrite": "<improved clause if category is recommendation, else empty>"
+    }}
+    """
+
+    def finish(parsed, response_text):
+        if parsed is None:
+            return {"compliance": _compliance_result(ctx, None, None, response_text), "risk": _risk_result(ctx, None, response_text)}
+
+        category = parsed["category"].strip().lower()
+        note = parsed.get("note", "")
+        if category == "good":
+            risk = {"good_clauses": [{"clause": clause, "reason": note}]}
+        elif category == "recommendation":
+            risk = {"recommendations": [{"clause": clause, "reason": note, "suggested_rewrite": parsed.get("suggested_rewrite", "")}]}
+        elif category == "risk":
+            risk = {"risk_clauses": [{"clause": clause, "risk": note}]}
+        else:
+            risk = None
+        return {
+            "compliance": _compliance_result(ctx, parsed["Violates"], parsed["Reason"], response_text),
+            "risk": _risk_result(ctx, risk, response_text)
+        }
+    return prompt, COMBINED_SCHEMA, COMBINED_MAX_TOKENS, finish
+
+# ====== Pipeline ======
+def plan_judgment(ctx, tasks, combined_prompt=False):
+    """
+    Answer what can be answered locally for one prepared clause.
+
+    Returns (results, requests): local verdicts by task, and the LLM requests still needed
+    for the other requested tasks ("compliance", "risk").
+    """
+    results = {}
+    if "compliance" in tasks:
+        local = _compliance_local(ctx)
+        if local is not None:
+            results["compliance"] = local
+    if "risk" in tasks:
+        local = _risk_local(ctx)
+        if local is not None:
+            results["risk"] = local
+
+    pending = [task for task in tasks if task not in results]
+    if combined_prompt and len(pending) == 2:
+        return results, [_combined_llm(ctx)]
+    requests = []
+    if "compliance" in pending:
+        requests.append(_compliance_llm(ctx))
+    if "risk" in pending:
+        requests.append(_risk_llm(ctx))
+    return results, requests
+
+def judge_clause(ctx, tasks, combined_prompt=False):
+    """Run the requested judgments ("compliance", "risk") for one prepared clause."""
+    results, requests = plan_judgment(ctx, tasks, combined_prompt)
+    for prompt, schema, max_tokens, finish in requests:
+        results.update(finish(*call_llm_json(prompt, schema, max_tokens)))
+    return results
+
+def failed_results(ctx, tasks, reason):
+    """Results recording that the requested tasks could not be judged for a clause, e.g. when the LLM was shed."""
+    results = {}
+    if "compliance" in tasks:
+        results["compliance"] = {"Clause": ctx["clause"], "Legal Rule": ctx["compliance"][0]['law_text'], "Violates": "UNKNOWN", "Reason": reason}
+    if "risk" in tasks:
+        results["risk"] = {"risk_clauses": [{"clause": ctx["clause"], "risk": reason}], "failed": True}
+    return results
+
+def is_failed(task, result):
+    """True if a stored `task` result records a failed LLM call rather than a judgment."""
+    if task == "compliance":
+        return str(result.get("Violates", "")).strip().upper() == "UNKNOWN"
+    # Records stored before failures were marked still carry the parse-failure text
+    return bool(result.get("failed")) or any(str(entry.get("risk", "")).startswith(RISK_PARSE_FAILURE)
+                                             for entry in result.get("risk_clauses", []))
+
+def empty_report(tasks):
+    report = {}
+    if "compliance" in tasks:
+        report["compliance"] = {}
+    if "risk" in tasks:
+        report["risk"] = {"good_clauses": [], "risk_clauses": [], "recommendations": []}
+    return report
+
+def add_to_report(report, ctx, results):
+    if "compliance" in results:
+        report["compliance"][ctx["clause"]] = results["compliance"]
+    if "risk" in results:
+        for key in report["risk"]:
+            report["risk"][key].extend(results["risk"].get(key, []))
+
+def analyze(clauses, tasks=("compliance", "risk"), combined_prompt=False):
+    """
+    Analyze clauses in a single pass: embed and retrieve once, then run each requested judgment.
+
+    Returns {"compliance": {clause: verdict}, "risk": {"good_clauses", "risk_clauses", "recommendations"}},
+    limited to the requested tasks.
+    """
+    report = empty_report(tasks)
+    for ctx in prepare(clauses):
+        add_to_report(report, ctx, judge_clause(ctx, tasks, combined_prompt))
+    return report
+
+# ====== Versioned Analysis ======
+def load_previous_analysis(analysis_id):
+    """Returns (stored analysis record or None, error); no id is not an error."""
+    if not analysis_id:
+        return None, None
+    previous = analysis_store.load(analysis_id)
+    if previous is None:
+        return None, f"Unknown or expired analysis id: {analysis_id}"
+    return previous, None
+
+def analyze_versioned(clauses, tasks=("compliance", "risk"), combined_prompt=False, previous=None):
+    """
+    Analyze a contract version, reusing the verdicts stored for `previous` (an analysis record).
+
+    Clauses are aligned with the previous version (revisions.align). Unchanged clauses keep
+    their stored results; only added or modified clauses, or ones missing a requested task,
+    are embedded and judged. Every run is stored so the next revision can reference it.
+
+    Returns:
+        tuple: (report in the format of analyze, diff with analysis_id, summary and changes)
+    """
+    revision = plan_revision(clauses, tasks, previous)
+    for ctx in prepare(list(revision["pending"])):
+        revision["results"][ctx["clause"]].update(judge_clause(ctx, revision["pending"][ctx["clause"]], combined_prompt))
+    return finish_revision(revision)
+
+def plan_revision(clauses, tasks, previous=None):
+    """Align `clauses` with `previous` and carry over stored results; "pending" maps each clause still to judge to its tasks."""
+    clauses = list(dict.fromkeys(clauses))
+    old_results = {entry["clause"]: entry["results"] for entry in previous["clauses"]} if previous else {}
+    alignment, removed = align(list(old_results), clauses)
+
+    results, pending = {}, {}
+    for clause in clauses:
+        status, old_clause, _ = alignment[clause]
+        results[clause] = dict(old_results[old_clause]) if status == "unchanged" else {}
+        # A failed judgment is not carried forward; the clause is judged again
+        for task in [task for task, result in results[clause].items() if is_failed(task, result)]:
+            del results[clause][task]
+        missing = tuple(task for task in tasks if task not in results[clause])
+        if missing:
+            pending[clause] = missing
+    return {"clauses": clauses, "tasks": tasks, "previous": previous, "old_results": old_results,
+            "alignment": alignment, "removed": removed, "results": results, "pending": pending}
+
+def finish_revision(revision):
+    """Store a judged revision and build its (report, diff)."""
+    clauses, tasks, previous = revision["clauses"], revision["tasks"], revision["previous"]
+    old_results, alignment, removed = revision["old_results"], revision["alignment"], revision["removed"]
+    results, pending = revision["results"], revision["pending"]
+
+    record = analysis_store.save(previous["id"] if previous else None, tasks, results)
+    report = empty_report(tasks)
+    for clause in clauses:
+        add_to_report(report, {"clause": clause}, {task: results[clause][task] for task in tasks})
+
+    changes = []
+    for clause in clauses:
+        status, old_clause, similarity = alignment[clause]
+        if status == "modified":
+            changes.append({"status": status, "clause": clause, "previous_clause": old_clause, "similarity": similarity,
+                            "results": results[clause], "previous_results": old_results[old_clause]})
+        elif status == "added":
+            changes.append({"status": status, "clause": clause, "results": results[clause]})
+    changes.extend({"status": "removed", "clause": clause, "previous_results": old_results[clause]} for clause in removed)
+
+    statuses = [alignment[clause][0] for clause in clauses]
+    diff = {
+        "analysis_id": record["id"],
+        "previous_analysis_id": previous["id"] if previous else None,
+        "summary": {
+            "unchanged": statuses.count("unchanged"),
+            "modified": statuses.count("modified"),
+            "added": statuses.count("added"),
+            "removed": len(removed),
+            "reanalysed": len(pending),
+        },
+        "changes": changes,
+    }
+    return report, diff
+
+def flag(value, default):
+    if value is None:
+        return default
+    return str(value).lower() in ("1", "true", "yes")
+
+# ====== Request Handling (shared by the Flask views and asgi.py) ======
+# task=None is the combined /analysis endpoint; "compliance" and "risk" are the single-task blueprints
+TASK_SEGMENTATION = {"compliance": "sentences", "risk": "llm"}
+
+def analysis_options(values, task=None):
+    """analyze() keyword arguments for a request's form values or JSON body."""
+    if task is None:
+        return {"tasks": ("compliance", "risk"), "combined_prompt": flag(values.get("combined_prompt"), True)}
+    return {"tasks": (task,), "combined_prompt": False}
+
+def segmentation_of(values, task=None):
+    return TASK_SEGMENTATION.get(task) or values.get("segmentation", "sentences")
+
+def segment(contract_text, segmentation):
+    """Returns (clauses, error)."""
+    if segmentation != "llm":
+        return split_clauses(contract_text), None
+    clauses_json, error = extract_clauses_llm(contract_text)
+    if error:
+        return None, error
+    return clauses_json.get("clauses", []), None
+
+def read_upload(files, values):
+    """(uploaded file, previous analysis record, error response) for an upload request."""
+    if 'file' not in files:
+        return None, None, ({"error": "No file uploaded"}, 400)
+    file = files['file']
+    if file.filename == '':
+        return None, None, ({"error": "No selected file"}, 400)
+    # Versioned mode: only clauses changed since this earlier analysis are re-analyzed
+    previous, error = load_previous_analysis(values.get("previous_analysis_id"))
+    if error:
+        return None, None, ({"error": error}, 404)
+    return file, previous, None
+
+def upload_response(report, diff, previous, task=None):
+    """
+    (body, status, headers) for an analyzed upload.
+
+    The combined endpoint returns the report with its analysis_id; a single-task endpoint
+    returns that task's report and the id in X-Analysis-Id. With a previous analysis the
+    diff is included.
+    """
+    if task is None:
+        if previous is None:
+            return {**report, "analysis_id": diff["analysis_id"]}, 200, {}
+        return {**report, **diff}, 200, {}
+    if previous is None:
+        return report[task], 200, {"X-Analysis-Id": diff["analysis_id"]}
+    return {**diff, "report": report[task]}, 200, {}
+
+def task_report(report, task=None):
+    return report if task is None else report[task]
+
+def handle_upload(files, values, task=None):
+    file, previous, error_response = read_upload(files, values)
+    if error_response:
+        return error_response
+    contract_text, error = extract_text(file)
+    if error:
+        return {"error": error}, 400
+    clauses, error = segment(contract_text, segmentation_of(values, task))
+    if error:
+        return {"error": error}, 500
+    report, diff = analyze_versioned(clauses, previous=previous, **analysis_options(values, task))
+    return upload_response(report, diff, previous, task)
+
+def handle_check_violation(data, task=None):
+    data = data or {}
+    return task_report(analyze(data.get("clauses", []), **analysis_options(data, task)), task)
+
+# ====== Flask Endpoints ======
+@analysis_bp.route('/upload', methods=['POST'])
+def upload_contract():
+    """
+    Risk and compliance report for one uploaded PDF.
+
+    Form/query options: segmentation = "sentences" (default, local) or "llm";
+    combined_prompt = true (default) to ask both questions in one LLM call per clause;
+    previous_analysis_id = the analysis_id of an earlier version of this contract, to
+    re-analyze only the clauses that changed and get a diff of the results.
+    """
+    return handle_upload(request.files, request.values)
+
+@analysis_bp.route("/check_violation", methods=["POST"])
+def check_violation():
+    return jsonify(handle_check_violation(request.json))
@@ -1,18 +1,32 @@
 from flask import Flask
 from contractpdf import contract_bp
+from contractagi import contract_agi_bp
 from compliancechcker import compliance_bp
 from riskanalyser import risk_bp
+from analysis import analysis_bp
+from batchanalysis import batch_bp
+from storage import storage_bp, STORAGE_URL_PREFIX
+from admission import admission_bp, install
 
 import os
 from flask_cors import CORS
 
 app = Flask(__name__)
-CORS(app) 
+CORS(app, expose_headers=["X-Analysis-Id", "Retry-After", "X-Queue-Wait-Ms", "X-Processing-Ms", "X-Render-Time-Ms"])
+
+# LLM-bound blueprints go through admission control (admission.py); hooks must be added before registering
+for blueprint in (contract_bp, contract_agi_bp, compliance_bp, risk_bp, analysis_bp, batch_bp):
+    install(blueprint)
 
 # Register blueprints
 app.register_blueprint(contract_bp, url_prefix="/contract")
+app.register_blueprint(contract_agi_bp, url_prefix="/contract/agi")
 app.register_blueprint(compliance_bp, url_prefix="/compliance")
-app.register_blueprint(compliance_bp, url_prefix="/risk")
+app.register_blueprint(risk_bp, url_prefix="/risk")
+app.register_blueprint(analysis_bp, url_prefix="/analysis")
+app.register_blueprint(batch_bp, url_prefix="/analysis/batch")
+app.register_blueprint(storage_bp, url_prefix=STORAGE_URL_PREFIX)
+app.register_blueprint(admission_bp, url_prefix="/admission")
 
 
 if __name__ == '__main__':
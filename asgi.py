@@ -0,0 +1,280 @@
+"""
+Async (ASGI) serving mode.
+
+    hypercorn -w 0 asgi:application --bind 0.0.0.0:5000
+    # or
+    python asgi.py
+
+The LLM-bound endpoints listed below are served by async Quart handlers: a request waiting
+on OpenRouter or on an admission slot is a suspended coroutine, not a blocked thread, so one
+process can hold hundreds of analyses in flight. CPU-bound work is offloaded: pdfplumber
+extraction and PDF rendering go to the shared process pool (procpool.py), InLegalBERT
+inference to a bounded thread pool of ASGI_CPU_WORKERS. Every other route (storage, bulk
+and batch jobs, SSE streaming) is passed through to the Flask app from app.py unchanged.
+Request parsing and response bodies come from the same helpers the Flask views use
+(analysis.py, contractpdf.py), so the formats match. `-w 0` serves from the main process;
+hypercorn's worker processes cannot start the process pool and use the thread pool instead.
+"""
+import os
+import asyncio
+import contextvars
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from quart import Quart, request, jsonify
+from quart_cors import cors
+from werkzeug.exceptions import NotFound, MethodNotAllowed
+from werkzeug.routing import RequestRedirect
+from hypercorn.middleware import AsyncioWSGIMiddleware
+
+from app import app as flask_app
+import admission
+from admission import Overloaded
+from procpool import get_process_pool
+from batchanalysis import BATCH_MAX_PDF_MB, BATCH_MAX_UPLOAD_MB
+from pdftext import extract_pdf_text
+from pdfrender import render_plain_pdf, wants_pdf_download, pdf_headers
+from storage import store_pdf
+from clausecache import clause_cache
+from llmjson import acall_llm_json, close_async_client, get_async_client, CLAUSES_SCHEMA
+from analysis import (split_clauses, clause_extraction_prompt, prepare, plan_judgment, plan_revision, finish_revision,
+                      empty_report, add_to_report, analysis_options, segmentation_of, read_upload, upload_response,
+                      task_report, clause_extraction_budget)
+from contractpdf import (retrieve_clause, refine_payload, refine_key, refined_text, generate_refined_clause, get_legal_template,
+                         generation_inputs, contract_filename, generated_response, OPENROUTER_API_URL, HEADERS)
+
+# ====== Configuration ======
+# Threads for in-process CPU work (InLegalBERT); torch releases the GIL, so these run in parallel
+ASGI_CPU_WORKERS = int(os.getenv("ASGI_CPU_WORKERS", str(os.cpu_count() or 1)))
+
+app = cors(Quart(__name__), expose_headers=["X-Analysis-Id", "Retry-After", "X-Queue-Wait-Ms", "X-Processing-Ms", "X-Render-Time-Ms"])
+# Quart caps bodies at 16 MB by default; allow a contract as large as a batch accepts
+app.config["MAX_CONTENT_LENGTH"] = int(BATCH_MAX_PDF_MB * 1024 * 1024) + 1024 * 1024
+
+_cpu_executor = ThreadPoolExecutor(max_workers=ASGI_CPU_WORKERS, thread_name_prefix="asgi-cpu")
+
+
+async def run_cpu(fn, *args):
+    """Run in-process CPU-bound work on the bounded thread pool, keeping the request's admission ticket."""
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_cpu_executor, ctx.run, fn, *args)
+
+
+async def run_in_process(fn, *args):
+    """Run a picklable CPU-bound function (PDF parsing, rendering) in the shared process pool."""
+    if multiprocessing.current_process().daemon:
+        # hypercorn's -w N workers are daemonic and may not start a pool; they parallelise across workers instead
+        return await run_cpu(fn, *args)
+    return await asyncio.get_running_loop().run_in_executor(get_process_pool(), fn, *args)
+
+
+# ====== Admission Control ======
+@app.before_request
+async def admit_request():
+    admission.use_ticket(None)
+    if request.method != "POST":
+        return None
+    try:
+        ticket = admission.admit(request.endpoint, admission.client_id(request.headers, request.remote_addr))
+    except Overloaded as e:
+        return busy(e.retry_after)
+    admission.use_ticket(ticket)
+    return None
+
+
+@app.after_request
+async def report_timings(response):
+    ticket = admission.current_ticket()
+    if ticket is not None:
+        response.headers.update(admission.timing_headers(ticket))
+    return response
+
+
+@app.errorhandler(Overloaded)
+async def overloaded(e):
+    return busy(e.retry_after)
+
+
+def busy(retry_after):
+    return jsonify({"error": "Server is busy, please retry later.", "retry_after": retry_after}), 503, {"Retry-After": str(retry_after)}
+
+
+@app.after_serving
+async def shutdown():
+    await close_async_client()
+
+
+# ====== Async Pipeline ======
+async def ajudge_clause(ctx, tasks, combined_prompt=False):
+    results, requests = plan_judgment(ctx, tasks, combined_prompt)
+    for prompt, schema, max_tokens, finish in requests:
+        results.update(finish(*await acall_llm_json(prompt, schema, max_tokens)))
+    return results
+
+
+async def ajudge_all(contexts, tasks, combined_prompt=False):
+    """
+    Judge every clause concurrently. The request's ticket lets only LLM_MAX_PER_REQUEST of its
+    calls queue at a time (admission.py), so a long contract waits on itself, not on others.
+    """
+    return await asyncio.gather(*(ajudge_clause(ctx, tasks, combined_prompt) for ctx in contexts))
+
+
+async def aanalyze(clauses, tasks=("compliance", "risk"), combined_prompt=False):
+    contexts = await run_cpu(prepare, clauses)
+    report = empty_report(tasks)
+    for ctx, results in zip(contexts, await ajudge_all(contexts, tasks, combined_prompt)):
+        add_to_report(report, ctx, results)
+    return report
+
+
+async def aanalyze_versioned(clauses, tasks=("compliance", "risk"), combined_prompt=False, previous=None):
+    revision = plan_revision(clauses, tasks, previous)
+    contexts = await run_cpu(prepare, list(revision["pending"]))
+    # Same per-request cap as ajudge_all
+    judged = await asyncio.gather(*(ajudge_clause(ctx, revision["pending"][ctx["clause"]], combined_prompt) for ctx in contexts))
+    for ctx, results in zip(contexts, judged):
+        revision["results"][ctx["clause"]].update(results)
+    return await asyncio.to_thread(finish_revision, revision)
+
+
+async def aextract_clauses_llm(contract_text):
+    parsed, _ = await acall_llm_json(clause_extraction_prompt(contract_text), CLAUSES_SCHEMA, clause_extraction_budget(contract_text))
+    if parsed is None:
+        return None, "Failed to parse AI response."
+    return parsed, None
+
+
+async def asegment(contract_text, segmentation):
+    """analysis.segment for coroutines."""
+    if segmentation != "llm":
+        return split_clauses(contract_text), None
+    clauses_json, error = await aextract_clauses_llm(contract_text)
+    if error:
+        return None, error
+    return clauses_json.get("clauses", []), None
+
+
+# ====== Request Handling ======
+async def handle_upload(task=None):
+    """analysis.handle_upload for coroutines."""
+    values = await request.values
+    file, previous, error_response = read_upload(await request.files, values)
+    if error_response:
+        return error_response
+    contract_text, error = await run_in_process(extract_pdf_text, file.read())
+    if error:
+        return {"error": error}, 400
+    clauses, error = await asegment(contract_text, segmentation_of(values, task))
+    if error:
+        return {"error": error}, 500
+    report, diff = await aanalyze_versioned(clauses, previous=previous, **analysis_options(values, task))
+    return upload_response(report, diff, previous, task)
+
+
+async def handle_check_violation(task=None):
+    """analysis.handle_check_violation for coroutines."""
+    data = await request.get_json() or {}
+    return jsonify(task_report(await aanalyze(data.get("clauses", []), **analysis_options(data, task)), task))
+
+
+# ====== Analysis Endpoints ======
+@app.route("/analysis/upload", methods=["POST"])
+async def upload_contract():
+    return await handle_upload()
+
+
+@app.route("/analysis/check_violation", methods=["POST"])
+async def check_violation():
+    return await handle_check_violation()
+
+
+# Same endpoints as compliancechcker.py and riskanalyser.py
+@app.route("/compliance/upload", methods=["POST"], endpoint="compliance.upload_contract")
+async def compliance_upload():
+    return await handle_upload("compliance")
+
+
+@app.route("/compliance/check_violation", methods=["POST"], endpoint="compliance.check_violation")
+async def compliance_check_violation():
+    return await handle_check_violation("compliance")
+
+
+@app.route("/risk/upload", methods=["POST"], endpoint="risk.upload_contract")
+async def risk_upload():
+    return await handle_upload("risk")
+
+
+@app.route("/risk/check_violation", methods=["POST"], endpoint="risk.check_violation")
+async def risk_check_violation():
+    return await handle_check_violation("risk")
+
+
+# ====== Contract Generation ======
+async def arefine_clause_with_llm(clause, contract_type, city):
+    payload = refine_payload(clause, contract_type, city)
+    key = refine_key(clause, contract_type, city)
+    try:
+        # A stale variant is refreshed on the cache's background thread with the blocking client
+        text = clause_cache.lookup(key, lambda: generate_refined_clause(clause, contract_type, city))
+        if text is None:
+            async with admission.allm_slot():
+                response = await get_async_client().post(OPENROUTER_API_URL, headers=HEADERS, json=payload, timeout=30)
+            text = refined_text(response)
+            await asyncio.to_thread(clause_cache.add, key, text)
+        return text
+    except Overloaded:
+        raise
+    except Exception as e:
+        print(f"Refinement Error: {str(e)}")
+        return clause
+
+
+@app.route("/contract/generate", methods=["POST"], endpoint="contract.generate_contract")
+async def generate_contract():
+    data = await request.get_json()
+    try:
+        clause_query, contract_type, city = generation_inputs(data)
+        clause = await run_cpu(retrieve_clause, clause_query, contract_type)
+        refined = await arefine_clause_with_llm(clause, contract_type, city)
+        contract = get_legal_template(data, refined)
+
+        filename = contract_filename(contract_type)
+        pdf_bytes, render_ms = await run_in_process(render_plain_pdf, contract)
+        if wants_pdf_download(request):
+            return pdf_bytes, 200, pdf_headers(pdf_bytes, filename, render_ms)
+
+        file_url = await asyncio.to_thread(store_pdf, filename, pdf_bytes, request.host_url)
+        return jsonify(generated_response(contract, file_url, render_ms))
+    except Overloaded:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+# ====== Dispatch ======
+# The middleware buffers each request body in memory; batch uploads are the largest the Flask routes accept
+_flask_wsgi = AsyncioWSGIMiddleware(flask_app, max_body_size=int(BATCH_MAX_UPLOAD_MB * 1024 * 1024) + 1024 * 1024)
+
+
+def _served_async(scope):
+    try:
+        app.url_map.bind("localhost").match(scope["path"], method=scope["method"])
+        return True
+    except (NotFound, MethodNotAllowed, RequestRedirect):
+        return False
+
+
+async def application(scope, receive, send):
+    """Async routes go to Quart; everything else falls through to the Flask app in threads."""
+    if scope["type"] == "lifespan" or (scope["type"] == "http" and _served_async(scope)):
+        await app(scope, receive, send)
+    else:
+        await _flask_wsgi(scope, receive, send)
+
+
+if __name__ == "__main__":
+    from hypercorn.config import Config
+    from hypercorn.asyncio import serve
+    config = Config()
+    config.bind = [f"0.0.0.0:{int(os.environ.get('PORT', 5000))}"]
+    asyncio.run(serve(application, config))
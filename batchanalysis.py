@@ -0,0 +1,280 @@
+import io
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Blueprint, request, jsonify, url_for
+from procpool import get_process_pool
+from admission import bind, job_ticket, current_ticket, Overloaded
+from jobs import job_store, finish, job_progress
+from pdftext import extract_pdf_text
+from analysis import split_clauses, extract_clauses_llm, prepare, judge_clause, failed_results, empty_report, add_to_report
+
+batch_bp = Blueprint("batch", __name__)
+
+# ====== Configuration ======
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "500"))
+BATCH_MAX_PDF_MB = float(os.getenv("BATCH_MAX_PDF_MB", "25"))
+# Whole request body, and the PDFs unpacked from it; a batch is held in memory while it runs
+BATCH_MAX_UPLOAD_MB = float(os.getenv("BATCH_MAX_UPLOAD_MB", "256"))
+# Batches up to this many documents are answered inline; larger ones run as a background job
+BATCH_SYNC_LIMIT = int(os.getenv("BATCH_SYNC_LIMIT", "5"))
+# Concurrent LLM-bound judgments across the whole batch; llmjson paces them to the provider quota
+BATCH_LLM_WORKERS = int(os.getenv("BATCH_LLM_WORKERS", "8"))
+# Background batches retry a shed LLM call this many times (after its Retry-After) before recording it as failed
+BATCH_SHED_RETRIES = int(os.getenv("BATCH_SHED_RETRIES", "3"))
+RECURRING_FINDINGS_LIMIT = 20
+
+_job_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="batch-job")
+
+
+def collect_documents(files):
+    """
+    (name, pdf bytes) for every uploaded PDF; ZIP uploads are expanded to the PDFs inside.
+
+    Raises ValueError when a limit is exceeded or nothing usable was uploaded.
+    """
+    max_bytes = int(BATCH_MAX_PDF_MB * 1024 * 1024)
+    max_total = int(BATCH_MAX_UPLOAD_MB * 1024 * 1024)
+    documents = []
+    total = 0
+
+    def add(name, size, read):
+        nonlocal total
+        if size > max_bytes:
+            raise ValueError(f"{name} exceeds {BATCH_MAX_PDF_MB:g} MB")
+        if len(documents) >= BATCH_MAX_DOCUMENTS:
+            raise ValueError(f"At most {BATCH_MAX_DOCUMENTS} documents per batch")
+        total += size
+        if total > max_total:
+            raise ValueError(f"Documents exceed {BATCH_MAX_UPLOAD_MB:g} MB in total")
+        documents.append((name, read()))
+
+    for upload in files:
+        data = upload.read()
+        if zipfile.is_zipfile(io.BytesIO(data)):
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for info in archive.infolist():
+                    base = os.path.basename(info.filename)
+                    if info.is_dir() or info.filename.startswith("__MACOSX/") or base.startswith(".") or not base.lower().endswith(".pdf"):
+                        continue
+                    add(info.filename, info.file_size, lambda info=info: archive.read(info))
+        else:
+            add(upload.filename or f"document_{len(documents) + 1}.pdf", len(data), lambda data=data: data)
+
+    if not documents:
+        raise ValueError("No PDF documents found in the upload")
+    return documents
+
+
+def new_job(total):
+    return job_store.create("batch", documents=total, extracted=0, clauses=0, judged=0)
+
+
+def _flagged(results):
+    """True if a clause's results contain a compliance violation or a risk finding."""
+    compliance = results.get("compliance")
+    if compliance and str(compliance.get("Violates", "")).strip().upper() == "YES":
+        return True
+    risk = results.get("risk", {})
+    return not risk.get("failed") and bool(risk.get("risk_clauses"))
+
+
+def portfolio_summary(reports, doc_clauses, results, tasks):
+    analysed = [(report, clauses) for report, clauses in zip(reports, doc_clauses) if "error" not in report]
+    total = sum(len(clauses) for _, clauses in analysed)
+    summary = {
+        "documents": len(reports),
+        "analysed": len(analysed),
+        "failed": len(reports) - len(analysed),
+        "clauses": total,
+        "distinct_clauses": len(results),
+    }
+    if "compliance" in tasks:
+        violations = [sum(1 for v in report["compliance"].values() if str(v.get("Violates", "")).strip().upper() == "YES")
+                      for report, _ in analysed]
+        summary["violations"] = sum(violations)
+        summary["documents_with_violations"] = sum(1 for v in violations if v)
+    if "risk" in tasks:
+        for key in ("good_clauses", "risk_clauses", "recommendations"):
+            summary[key] = sum(len(report["risk"][key]) for report, _ in analysed)
+        summary["documents_with_risks"] = sum(1 for report, _ in analysed if report["risk"]["risk_clauses"])
+
+    # A problem clause shared by several documents usually comes from a common template
+    documents_by_clause = {}
+    for report, clauses in analysed:
+        for clause in clauses:
+            if _flagged(results[clause]):
+                documents_by_clause.setdefault(clause, []).append(report["document"])
+    recurring = sorted(((clause, docs) for clause, docs in documents_by_clause.items() if len(docs) > 1),
+                       key=lambda item: -len(item[1]))
+    summary["recurring_findings"] = [{"clause": clause, "documents": docs} for clause, docs in recurring[:RECURRING_FINDINGS_LIMIT]]
+    return summary
+
+
+def _tolerate_shedding(fn, on_shed):
+    """
+    Wrap an LLM-bound `fn` for background batches.
+
+    A call that raises Overloaded is retried after its Retry-After, up to BATCH_SHED_RETRIES
+    times; after that `on_shed(error, *args)` supplies the result, so one shed clause does
+    not discard the rest of the portfolio.
+    """
+    def run(*args):
+        for attempt in range(BATCH_SHED_RETRIES + 1):
+            try:
+                return fn(*args)
+            except Overloaded as e:
+                if attempt == BATCH_SHED_RETRIES:
+                    return on_shed(e, *args)
+                time.sleep(e.retry_after)
+    return run
+
+
+def run_batch(job, documents, tasks=("compliance", "risk"), segmentation="sentences", combined_prompt=True, background=False):
+    """
+    Analyze many documents as one workload.
+
+    Text extraction runs in the shared process pool. Clauses from all documents are pooled
+    and de-duplicated, so each distinct clause is embedded (in large batches) and judged once.
+    Judgments run on BATCH_LLM_WORKERS threads for the whole batch rather than per document.
+    Inline batches fail with Overloaded when the LLM is shed (the endpoint answers 503);
+    background ones retry and record what stays shed on the clause or document.
+    """
+    job["status"] = "running"
+    started = time.perf_counter()
+    timings = {}
+    extract, judge = extract_clauses_llm, judge_clause
+    if background:
+        extract = _tolerate_shedding(extract_clauses_llm, lambda e, text: (None, str(e)))
+        judge = _tolerate_shedding(judge_clause, lambda e, ctx, tasks, combined_prompt: failed_results(ctx, tasks, str(e)))
+    try:
+        # PDF parsing is CPU-bound: fan it out across cores
+        texts = [None] * len(documents)
+        errors = {}
+        pool = get_process_pool()
+        futures = {pool.submit(extract_pdf_text, data): i for i, (_, data) in enumerate(documents)}
+        for future in as_completed(futures):
+            i = futures[future]
+            texts[i], error = future.result()
+            if error:
+                errors[i] = error
+            job["extracted"] += 1
+        timings["extract_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        phase = time.perf_counter()
+        doc_clauses = [[] for _ in documents]
+        pending = [i for i in range(len(documents)) if i not in errors]
+        if segmentation == "llm":
+            with ThreadPoolExecutor(max_workers=BATCH_LLM_WORKERS) as llm_pool:
+                futures = {llm_pool.submit(bind(extract), texts[i]): i for i in pending}
+                for future in as_completed(futures):
+                    i = futures[future]
+                    clauses_json, error = future.result()
+                    if error:
+                        errors[i] = error
+                    else:
+                        doc_clauses[i] = list(dict.fromkeys(clauses_json.get("clauses", [])))
+        else:
+            for i in pending:
+                doc_clauses[i] = list(dict.fromkeys(split_clauses(texts[i])))
+        timings["segment_ms"] = round((time.perf_counter() - phase) * 1000, 1)
+
+        # One embedding and retrieval pass over the distinct clauses of the whole batch
+        phase = time.perf_counter()
+        contexts = prepare([clause for clauses in doc_clauses for clause in clauses])
+        job["clauses"] = len(contexts)
+        timings["embed_ms"] = round((time.perf_counter() - phase) * 1000, 1)
+
+        phase = time.perf_counter()
+        results = {}
+        with ThreadPoolExecutor(max_workers=BATCH_LLM_WORKERS) as llm_pool:
+            futures = {llm_pool.submit(bind(judge), ctx, tasks, combined_prompt): ctx for ctx in contexts}
+            for future in as_completed(futures):
+                results[futures[future]["clause"]] = future.result()
+                job["judged"] += 1
+        timings["judge_ms"] = round((time.perf_counter() - phase) * 1000, 1)
+
+        contexts_by_clause = {ctx["clause"]: ctx for ctx in contexts}
+        reports = []
+        for i, (name, _) in enumerate(documents):
+            if i in errors:
+                reports.append({"document": name, "error": errors[i]})
+                continue
+            report = empty_report(tasks)
+            for clause in doc_clauses[i]:
+                add_to_report(report, contexts_by_clause[clause], results[clause])
+            reports.append({"document": name, "clauses": len(doc_clauses[i]), **report})
+
+        summary = portfolio_summary(reports, doc_clauses, results, tasks)
+        elapsed = time.perf_counter() - started
+        timings["elapsed_ms"] = round(elapsed * 1000, 1)
+        ticket = current_ticket()
+        if ticket is not None:
+            # Summed over concurrent calls, so it can exceed judge_ms
+            timings["queue_wait_ms"] = ticket.timings()["queue_wait_ms"]
+        summary["timings"] = timings
+        summary["clauses_per_second"] = round(summary["clauses"] / elapsed, 2) if elapsed else None
+
+        finish(job, result={"documents": reports, "portfolio": summary})
+    except Overloaded as e:
+        finish(job, error=str(e))
+        raise
+    except Exception as e:
+        print(f"Batch job {job['id']} failed: {str(e)}")
+        finish(job, error=str(e))
+    return job
+
+
+def _tasks(value):
+    tasks = tuple(task for task in ("compliance", "risk") if task in (value or "compliance,risk").split(","))
+    return tasks or ("compliance", "risk")
+
+
+# ====== Flask Endpoints ======
+@batch_bp.route("", methods=["POST"])
+def batch_analysis():
+    """
+    Analyze a data room: several PDFs under `files`, and/or ZIP archives of PDFs.
+
+    Form options: tasks = "compliance,risk" (default) or one of them; segmentation =
+    "sentences" (default) or "llm"; combined_prompt = true (default).
+    """
+    if (request.content_length or 0) > BATCH_MAX_UPLOAD_MB * 1024 * 1024:
+        return jsonify({"error": f"Upload exceeds {BATCH_MAX_UPLOAD_MB:g} MB"}), 413
+    files = request.files.getlist("files") + request.files.getlist("file")
+    if not files:
+        return jsonify({"error": "No files uploaded"}), 400
+    try:
+        documents = collect_documents(files)
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({"error": str(e)}), 400
+
+    options = {
+        "tasks": _tasks(request.values.get("tasks")),
+        "segmentation": request.values.get("segmentation", "sentences"),
+        "combined_prompt": request.values.get("combined_prompt", "true").lower() in ("1", "true", "yes"),
+    }
+    job = new_job(len(documents))
+    if len(documents) <= BATCH_SYNC_LIMIT:
+        run_batch(job, documents, **options)
+        if job["status"] == "failed":
+            return jsonify({"error": job["error"]}), 500
+        return jsonify(job["result"])
+
+    _job_executor.submit(bind(run_batch, job_ticket()), job, documents, background=True, **options)
+    return jsonify({
+        "job_id": job["id"],
+        "status": job["status"],
+        "documents": len(documents),
+        "status_url": url_for("batch.batch_status", job_id=job["id"], _external=True),
+    }), 202
+
+
+@batch_bp.route("/<job_id>", methods=["GET"])
+def batch_status(job_id):
+    # Jobs live in the process that ran them; see jobs.py
+    job = job_store.get("batch", job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job_progress(job))
@@ -0,0 +1,109 @@
+import io
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import copy_current_request_context
+from storage import store_file
+from procpool import get_process_pool
+from admission import bind, job_ticket, current_ticket, Overloaded
+from jobs import job_store, finish
+
+# ====== Configuration ======
+BULK_MAX_RECORDS = int(os.getenv("BULK_MAX_RECORDS", "1000"))
+# Batches up to this size are answered inline; larger ones run as a background job with progress polling
+BULK_SYNC_LIMIT = int(os.getenv("BULK_SYNC_LIMIT", "20"))
+BULK_CLAUSE_WORKERS = 4
+
+_job_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bulk-job")
+
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "_", str(text).lower()).strip("_")[:40] or "party"
+
+
+def new_job(total):
+    return job_store.create("bulk", total=total, clauses=0, rendered=0)
+
+
+def run_bulk(job, records, clause_key, make_clause, make_contract, renderer, output="manifest"):
+    """
+    Generate one contract per record.
+
+    Args:
+        job: Job dict from `new_job`, updated in place with progress.
+        records: List of fully merged request dicts, one per contract.
+        clause_key: record -> hashable key; records sharing a key share one generated clause.
+        make_clause: record -> clause text, called once per distinct key.
+        make_contract: (record, clause) -> contract text.
+        renderer: Picklable top-level function text -> (pdf bytes, render ms), run in the process pool.
+        output: "manifest" for one stored PDF per record, "zip" for a single stored archive.
+    """
+    job["status"] = "running"
+    started = time.perf_counter()
+    try:
+        # Clause generation is LLM-bound, so threads are enough; only distinct keys are generated
+        distinct = {}
+        for record in records:
+            distinct.setdefault(clause_key(record), record)
+        clauses = {}
+        with ThreadPoolExecutor(max_workers=BULK_CLAUSE_WORKERS) as pool:
+            futures = {pool.submit(bind(make_clause), record): key for key, record in distinct.items()}
+            for future in as_completed(futures):
+                clauses[futures[future]] = future.result()
+                job["clauses"] += 1
+
+        contracts = [make_contract(record, clauses[clause_key(record)]) for record in records]
+        filenames = [f"{i + 1:04d}_{_slug(r.get('contract_type'))}_{_slug(r.get('party_b'))}.pdf" for i, r in enumerate(records)]
+
+        # PDF rendering is CPU-bound: fan it out across cores
+        pdfs = [None] * len(contracts)
+        render_ms = 0.0
+        pool = get_process_pool()
+        futures = {pool.submit(renderer, text): i for i, text in enumerate(contracts)}
+        for future in as_completed(futures):
+            pdf_bytes, ms = future.result()
+            pdfs[futures[future]] = pdf_bytes
+            render_ms += ms
+            job["rendered"] += 1
+
+        if output == "zip":
+            buf = io.BytesIO()
+            with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as archive:
+                for filename, pdf_bytes in zip(filenames, pdfs):
+                    archive.writestr(filename, pdf_bytes)
+            result = {"archive_url": store_file(f"contracts_{job['id'][:8]}.zip", buf.getvalue())}
+        else:
+            result = {"contracts": [
+                {"index": i, "party_a": r.get("party_a"), "party_b": r.get("party_b"), "pdf_url": store_file(filename, pdf_bytes)}
+                for i, (r, filename, pdf_bytes) in enumerate(zip(records, filenames, pdfs))
+            ]}
+
+        result.update({
+            "count": len(records),
+            "distinct_clauses": len(distinct),
+            "render_ms": round(render_ms, 1),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+        ticket = current_ticket()
+        if ticket is not None:
+            # Summed over concurrent clause generations, so it can exceed elapsed_ms
+            result["queue_wait_ms"] = ticket.timings()["queue_wait_ms"]
+        finish(job, result=result)
+    except Overloaded as e:
+        # Inline batches answer 503 + Retry-After; background jobs just record the failure
+        finish(job, error=str(e))
+        raise
+    except Exception as e:
+        print(f"Bulk job {job['id']} failed: {str(e)}")
+        finish(job, error=str(e))
+    return job
+
+
+def submit_bulk(job, *args, **kwargs):
+    """Run `run_bulk` in the background. Call from a request: the request context is kept so artifact URLs resolve."""
+    @copy_current_request_context
+    def run():
+        return run_bulk(job, *args, **kwargs)
+    return _job_executor.submit(bind(run, job_ticket()))
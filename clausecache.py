@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# ====== Configuration ======
+CLAUSE_CACHE_PATH = os.getenv("CLAUSE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "clause_cache.json"))
+CLAUSE_CACHE_VARIANTS = int(os.getenv("CLAUSE_CACHE_VARIANTS", "3"))
+CLAUSE_CACHE_TTL_HOURS = float(os.getenv("CLAUSE_CACHE_TTL_HOURS", "72"))
+# Keys include free-form request fields, so the least recently used ones are dropped past this many
+CLAUSE_CACHE_MAX_KEYS = int(os.getenv("CLAUSE_CACHE_MAX_KEYS", "5000"))
+# Changes are written to disk at most this often, off the request thread
+CLAUSE_CACHE_SAVE_SECONDS = float(os.getenv("CLAUSE_CACHE_SAVE_SECONDS", "5"))
+
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="clause-refresh")
+
+
+def make_key(kind, model, prompt_version, contract_type, jurisdiction, scope=""):
+    """Normalise generation inputs into a cache key; casing and spacing differences share an entry."""
+    parts = [kind, model, prompt_version, contract_type, jurisdiction, scope or ""]
+    return "|".join(" ".join(str(p).lower().split()) for p in parts)
+
+
+class ClauseCache:
+    """
+    Memoizes LLM-generated clauses, keeping a pool of up to `variants` texts per key.
+
+    Until a key's pool is full every request generates a new variant, so repeated
+    contracts don't all get identical wording. Once full, variants are served
+    round-robin; a variant older than `ttl_seconds` is still served but regenerated
+    in the background. At most `max_keys` keys are kept, least recently used dropped
+    first. The cache is persisted to `path` as JSON, `save_delay` seconds after a change
+    on a timer thread, so a pre-warmed cache survives restarts.
+    """
+
+    def __init__(self, path, variants, ttl_seconds, max_keys=CLAUSE_CACHE_MAX_KEYS, save_delay=CLAUSE_CACHE_SAVE_SECONDS):
+        self.path = path
+        self.variants = variants
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self.save_delay = save_delay
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> {"variants": [{"text", "created"}], "next": int}, least recently used first
+        self._refreshing = set()
+        self._save_pending = False
+        self._load()
+        atexit.register(self._flush)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                self._entries = OrderedDict(json.load(f))
+            self._trim()
+            print(f"Loaded {len(self._entries)} cached clause keys from {self.path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading clause cache: {e}")
+
+    def save(self):
+        # Saves run from request threads and the refresh executor; serialise them so the newest snapshot lands last
+        with self._save_lock:
+            with self._lock:
+                snapshot = json.dumps(self._entries)
+            tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(snapshot)
+            os.replace(tmp_path, self.path)
+
+    def get(self, key, generate):
+        """
+        Return a cached clause for `key`, calling `generate()` when the pool needs another variant.
+
+        `generate` should raise on failure; failures are never cached.
+        """
+        text = self.lookup(key, generate)
+        if text is None:
+            text = generate()
+            self.add(key, text)
+        return text
+
+    def lookup(self, key, refresh):
+        """
+        Return the next variant for `key` if its pool is full, else None (a miss).
+
+        A stale variant is still returned and regenerated in the background with `refresh()`.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or len(entry["variants"]) < self.variants:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            pool = entry["variants"]
+            index = entry["next"] % len(pool)
+            entry["next"] = index + 1
+            variant = pool[index]
+            self.stats["hits"] += 1
+            stale = time.time() - variant["created"] > self.ttl_seconds
+            if stale and (key, index) not in self._refreshing:
+                self._refreshing.add((key, index))
+                _refresh_executor.submit(self._refresh, key, index, refresh)
+            return variant["text"]
+
+    def add(self, key, text):
+        """Add a freshly generated variant to `key`'s pool unless it is already full."""
+        with self._lock:
+            pool = self._entries.setdefault(key, {"variants": [], "next": 0})["variants"]
+            self._entries.move_to_end(key)
+            if len(pool) >= self.variants:
+                return
+            pool.append({"text": text, "created": time.time()})
+            self._trim()
+        self._schedule_save()
+
+    def _trim(self):
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+    def _refresh(self, key, index, generate):
+        try:
+            text = generate()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    return  # evicted while regenerating
+                entry["variants"][index] = {"text": text, "created": time.time()}
+                self.stats["refreshes"] += 1
+            self._schedule_save()
+        except Exception as e:
+            print(f"Clause cache refresh failed for {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard((key, index))
+
+    def _schedule_save(self):
+        with self._lock:
+            if self._save_pending:
+                return
+            self._save_pending = True
+        timer = threading.Timer(self.save_delay, self._flush)
+        timer.daemon = True
+        timer.start()
+
+    def _flush(self):
+        with self._lock:
+            if not self._save_pending:
+                return
+            self._save_pending = False
+        self._save_quietly()
+
+    def _save_quietly(self):
+        try:
+            self.save()
+        except Exception as e:
+            print(f"Error saving clause cache: {e}")
+
+
+clause_cache = ClauseCache(CLAUSE_CACHE_PATH, CLAUSE_CACHE_VARIANTS, CLAUSE_CACHE_TTL_HOURS * 3600)
@@ -1,25 +1,38 @@
 import os
-import requests
+import json
+import time
 import re
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
-from langchain.agents import create_react_agent, AgentExecutor, tool
-from langchain import hub
-from flask import Blueprint, request, jsonify
+from langchain.agents import tool
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from pydantic import BaseModel
-from fpdf import FPDF
+from pdfrender import render_contract_pdf, wants_pdf_download, pdf_response
+from storage import store_pdf
+from clausecache import clause_cache, make_key
+from admission import llm_slot, current_ticket, Overloaded
 
 load_dotenv()
 
 # ==== Flask Blueprint ====
-contract_bp = Blueprint("contract", __name__, url_prefix="/contract")
+# Mounted at /contract/agi by app.py, next to contractpdf's /contract blueprint
+contract_agi_bp = Blueprint("contract_agi", __name__)
 
 # ==== Configuration ====
 GROQ_MODEL = "deepseek-r1-distill-qwen-32b"
+# Bump whenever the clause prompt changes so cached clauses from the old prompt are not served
+CLAUSE_PROMPT_VERSION = "v1"
 
-llm = ChatGroq(api_key=os.getenv("GROQ_API_KEY"), model=GROQ_MODEL, temperature=0.7,  # More deterministic output
-    max_tokens=1024,  # Prevent excessive generation
-    timeout=30 )
+_llm = None
+
+def get_llm():
+    """The Groq chat model, created on first use so the app starts without GROQ_API_KEY."""
+    global _llm
+    if _llm is None:
+        _llm = ChatGroq(api_key=os.getenv("GROQ_API_KEY"), model=GROQ_MODEL, temperature=0.7,  # More deterministic output
+            max_tokens=1024,  # Prevent excessive generation
+            timeout=30 )
+    return _llm
 
 # ==== Tool Schemas ====
 class GenerateClauseInput(BaseModel):
@@ -34,14 +47,6 @@ class ContractTemplateInput(BaseModel):
     contract_type: str
     clause: str
 
-class PDFGenerationInput(BaseModel):
-    contract_content: str
-    filename: str = "generated_contract.pdf"
-    contract_metadata: dict = {}  # Add metadata for better PDF formatting
-
-class UploadToGoFileInput(BaseModel):
-    filepath: str
-
 # ==== Tools ====
 @tool(args_schema=GenerateClauseInput)
 def generate_clause(contract_type: str, jurisdiction: str, scope: str = ""):
@@ -56,16 +61,37 @@ def generate_clause(contract_type: str, jurisdiction: str, scope: str = ""):
     Returns:
         str: Generated legal clause.
     """
+    key = make_key("groq-clause", GROQ_MODEL, CLAUSE_PROMPT_VERSION, contract_type, jurisdiction, scope)
+    prompt = clause_prompt(contract_type, jurisdiction, scope)
+    return clause_cache.get(key, lambda: _invoke_clause(prompt))
+
+def _invoke_clause(prompt):
+    with llm_slot():
+        return clean_contract_output(get_llm().invoke(prompt).content)
+
+def clause_prompt(contract_type, jurisdiction, scope=""):
     scope_info = f" The scope of noncompete is specifically {scope}." if scope else ""
-    prompt = (
+    return (
         f"As a senior Indian legal expert, draft a robust, enforceable legal clause "
         f"for a {contract_type} agreement applicable in {jurisdiction}.{scope_info} "
         "Explicitly reference current relevant Indian acts, laws, include clear obligations, "
         "remedies, termination conditions, governing law, dispute resolution (arbitration), "
         "and force majeure clauses. Keep concise, precise, under 150 words.Return in a pdf friendly format. DON'T RETURN YOUR REASONING PROCESS ONLY THE CONTRACT."
     )
-    response = llm.invoke(prompt)
-    return response.content.strip()
+
+# Problematic Unicode characters and their ASCII equivalents
+UNICODE_REPLACEMENTS = {
+    '’': "'",   # Right single quote
+    '‘': "'",   # Left single quote
+    '“': '"',   # Left double quote
+    '”': '"',   # Right double quote
+    '–': '-',   # En-dash
+    '—': '-',   # Em-dash
+    '₹': 'Rs.', # Rupee symbol
+    '…': '...', # Ellipsis
+    '•': '-',   # Bullet
+    ' ': ' ',   # Non-breaking space
+}
 
 # Helper function to clean the contract output
 def clean_contract_output(contract_text):
@@ -75,20 +101,7 @@ def clean_contract_output(contract_text):
     cleaned_text = re.sub(r'\n{3,}', '\n\n', cleaned_text)
     
     # Replace problematic Unicode characters with ASCII equivalents
-    replacements = {
-        '’': "'",   # Right single quote
-        '‘': "'",   # Left single quote
-        '“': '"',   # Left double quote
-        '”': '"',   # Right double quote
-        '–': '-',   # En-dash
-        '—': '-',   # Em-dash
-        '₹': 'Rs.', # Rupee symbol
-        '…': '...', # Ellipsis
-        '•': '-',   # Bullet
-        ' ': ' ',   # Non-breaking space
-    }
-
-    for unicode_char, ascii_char in replacements.items():
+    for unicode_char, ascii_char in UNICODE_REPLACEMENTS.items():
         cleaned_text = cleaned_text.replace(unicode_char, ascii_char)
     
     # Remove any other remaining non-Latin-1 characters
@@ -96,6 +109,71 @@ def clean_contract_output(contract_text):
     
     return cleaned_text.strip()
 
+class StreamingClauseCleaner:
+    """
+    Applies clean_contract_output incrementally to a token stream.
+
+    <think> blocks are dropped as they arrive, even when a tag is split across
+    chunks, and whitespace is held back until the next visible character so that
+    blank-line collapsing and the final strip() match the batch cleaner.
+    """
+    OPEN_TAG, CLOSE_TAG = "<think>", "</think>"
+
+    def __init__(self):
+        self.buffer = ""
+        self.in_think = False
+        self.pending_ws = ""
+        self.started = False
+        self.emitted = []
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        visible = []
+        while self.buffer:
+            tag = self.CLOSE_TAG if self.in_think else self.OPEN_TAG
+            index = self.buffer.find(tag)
+            if index >= 0:
+                if not self.in_think:
+                    visible.append(self.buffer[:index])
+                self.buffer = self.buffer[index + len(tag):]
+                self.in_think = not self.in_think
+                continue
+            # Hold back a trailing fragment that could be the start of the tag
+            keep = next((n for n in range(min(len(tag) - 1, len(self.buffer)), 0, -1) if tag.startswith(self.buffer[-n:])), 0)
+            if not self.in_think:
+                visible.append(self.buffer[:len(self.buffer) - keep])
+            self.buffer = self.buffer[len(self.buffer) - keep:]
+            break
+        return self._normalise("".join(visible))
+
+    def finish(self):
+        """Flush what is left; an unterminated <think> block is discarded."""
+        tail = "" if self.in_think else self.buffer
+        self.buffer = ""
+        return self._normalise(tail)
+
+    def text(self):
+        return "".join(self.emitted)
+
+    def _normalise(self, text):
+        for unicode_char, ascii_char in UNICODE_REPLACEMENTS.items():
+            text = text.replace(unicode_char, ascii_char)
+        text = text.encode('latin-1', 'ignore').decode('latin-1')
+        out = []
+        for char in text:
+            if char.isspace():
+                self.pending_ws += char
+                continue
+            if self.started:
+                out.append(re.sub(r'\n{3,}', '\n\n', self.pending_ws))
+            self.pending_ws = ""
+            self.started = True
+            out.append(char)
+        cleaned = "".join(out)
+        if cleaned:
+            self.emitted.append(cleaned)
+        return cleaned
+
 @tool(args_schema=ContractTemplateInput)
 def contract_template(parties: dict, duration: str, jurisdiction: str, contract_type: str, clause: str):
     """
@@ -129,90 +207,8 @@ Signed:
 """
     return content.strip()
 
-@tool(args_schema=PDFGenerationInput)
-def pdf_generation(contract_content: str, filename: str = "generated_contract.pdf", contract_metadata: dict = {}):
-    """
-    Generate a professional-looking PDF from contract content with UTF-8 support.
-    """
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-
-    # Use a Unicode-capable font (DejaVuSans)
-    pdf.add_font("DejaVu", "", "DejaVuSans.ttf", uni=True)
-    pdf.add_font("DejaVu", "B", "DejaVuSans-Bold.ttf", uni=True)
-
-    contract_type = contract_metadata.get("contract_type", "").upper()
-
-    # Title
-    pdf.set_font("DejaVu", "B", 16)
-    pdf.cell(0, 10, f"{contract_type} AGREEMENT", 0, 1, "C")
-    pdf.ln(5)
-
-    # Content
-    pdf.set_font("DejaVu", "", 12)
-    lines = contract_content.split("\n")
-    for line in lines:
-        if line.strip().upper() == f"{contract_type} AGREEMENT":
-            continue
-        elif line.strip().startswith("This") and "Agreement is made between" in line:
-            pdf.set_font("DejaVu", "B", 12)
-            pdf.multi_cell(0, 10, line)
-            pdf.ln(5)
-            pdf.set_font("DejaVu", "", 12)
-        elif line.strip().startswith("Signed:"):
-            pdf.ln(10)
-            pdf.set_font("DejaVu", "B", 12)
-            pdf.cell(0, 10, line, 0, 1)
-        elif line.strip() and line[0].isdigit() and ". " in line[:5]:
-            pdf.set_font("DejaVu", "B", 12)
-            pdf.multi_cell(0, 10, line)
-            pdf.set_font("DejaVu", "", 12)
-        elif line.strip().startswith("**") and line.strip().endswith("**"):
-            pdf.set_font("DejaVu", "B", 12)
-            cleaned_line = line.strip().replace("**", "")
-            pdf.multi_cell(0, 10, cleaned_line)
-            pdf.set_font("DejaVu", "", 12)
-        elif line.strip():
-            pdf.multi_cell(0, 10, line)
-
-    pdf.output(filename)
-    return filename
-
-@tool(args_schema=UploadToGoFileInput)
-def upload_to_gofile(filepath: str):
-    """
-    Upload PDF file to GoFile.io.
-
-    Args:
-        filepath: Path to the PDF file.
-
-    Returns:
-        str: URL to uploaded PDF.
-    """
-    with open(filepath, "rb") as f:
-        response = requests.post("https://store1.gofile.io/uploadFile", files={"file": f})
-    res_json = response.json()
-    if response.status_code == 200 and res_json.get("status") == "ok":
-        return res_json["data"]["downloadPage"]
-    else:
-        raise Exception("GoFile upload failed.")
-
-# ==== Initialize Agent ====
-prompt_template = hub.pull("hwchase17/react")
-
-tools = [
-    generate_clause,
-    contract_template,
-    pdf_generation,
-    upload_to_gofile
-]
-
-agent = create_react_agent(llm, tools, prompt_template)
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
-
 # ==== Flask Endpoint ====
-@contract_bp.route("/generate", methods=["POST"])
+@contract_agi_bp.route("/generate", methods=["POST"])
 def generate_contract():
     data = request.json
     required_fields = ["party_a", "party_b", "duration", "jurisdiction", "contract_type"]
@@ -250,29 +246,115 @@ def generate_contract():
         # Clean the contract output to remove any thinking sections
         cleaned_contract = clean_contract_output(contract)
 
-        # Generate PDF with the cleaned contract and metadata for better formatting
-        filename = pdf_generation.invoke({
-            "contract_content": cleaned_contract,
-            "filename": f"{contract_type.lower()}_agreement_{party_a.split()[0].lower()}_{party_b.split()[0].lower()}.pdf",
-            "contract_metadata": {
-                "contract_type": contract_type,
-                "jurisdiction": jurisdiction,
-                "party_a": party_a,
-                "party_b": party_b,
-                "duration": duration
-            }
+        # Render the PDF in memory with the cleaned contract and metadata for better formatting
+        filename = f"{contract_type.lower()}_agreement_{party_a.split()[0].lower()}_{party_b.split()[0].lower()}.pdf"
+        pdf_bytes, render_ms = render_contract_pdf(cleaned_contract, {
+            "contract_type": contract_type,
+            "jurisdiction": jurisdiction,
+            "party_a": party_a,
+            "party_b": party_b,
+            "duration": duration
         })
+        if wants_pdf_download(request):
+            return pdf_response(pdf_bytes, filename, render_ms)
 
-        # Upload to GoFile
-        file_url = upload_to_gofile.invoke({
-            "filepath": filename
-        })
+        # Store the PDF; the URL is served by this app
+        file_url = store_pdf(filename, pdf_bytes)
 
         return jsonify({
             "message": "Contract generated and uploaded.",
             "contract": cleaned_contract,
-            "pdf_url": file_url
+            "pdf_url": file_url,
+            "render_ms": round(render_ms, 1)
         }), 200
 
+    except Overloaded:
+        raise
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+# ==== Streaming Endpoint ====
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@contract_agi_bp.route("/generate/stream", methods=["POST"])
+def generate_contract_stream():
+    """
+    Stream the legal clause to the client as Server-Sent Events while the model generates it.
+
+    Events: `clause` ({"text": ...}) for each cleaned fragment, then `done` with the full
+    contract, pdf_url and timings, or `error`. The PDF is rendered once the clause is complete.
+    """
+    data = request.json
+    required_fields = ["party_a", "party_b", "duration", "jurisdiction", "contract_type"]
+    if not all(field in data for field in required_fields):
+        return jsonify({"error": "Missing required fields"}), 400
+
+    started = time.perf_counter()
+    contract_type = data['contract_type']
+    jurisdiction = data['jurisdiction']
+    party_a = data['party_a']
+    party_b = data['party_b']
+    duration = data['duration']
+    scope = data.get('scope', '')
+    key = make_key("groq-clause", GROQ_MODEL, CLAUSE_PROMPT_VERSION, contract_type, jurisdiction, scope)
+    prompt = clause_prompt(contract_type, jurisdiction, scope)
+
+    def events():
+        ttfb_ms = None
+        try:
+            clause = clause_cache.lookup(key, lambda: _invoke_clause(prompt))
+            if clause is not None:
+                ttfb_ms = (time.perf_counter() - started) * 1000
+                yield _sse("clause", {"text": clause})
+            else:
+                cleaner = StreamingClauseCleaner()
+                with llm_slot():
+                    for chunk in get_llm().stream(prompt):
+                        text = cleaner.feed(chunk.content)
+                        if text:
+                            if ttfb_ms is None:
+                                ttfb_ms = (time.perf_counter() - started) * 1000
+                            yield _sse("clause", {"text": text})
+                tail = cleaner.finish()
+                if tail:
+                    yield _sse("clause", {"text": tail})
+                clause = cleaner.text()
+                if not clause:
+                    raise Exception("Model returned no clause text")
+                clause_cache.add(key, clause)
+
+            contract = contract_template.invoke({
+                "parties": {"party_a": party_a, "party_b": party_b},
+                "duration": duration,
+                "jurisdiction": jurisdiction,
+                "contract_type": contract_type,
+                "clause": clause
+            })
+            cleaned_contract = clean_contract_output(contract)
+            filename = f"{contract_type.lower()}_agreement_{party_a.split()[0].lower()}_{party_b.split()[0].lower()}.pdf"
+            pdf_bytes, render_ms = render_contract_pdf(cleaned_contract, {
+                "contract_type": contract_type,
+                "jurisdiction": jurisdiction,
+                "party_a": party_a,
+                "party_b": party_b,
+                "duration": duration
+            })
+            ticket = current_ticket()
+            yield _sse("done", {
+                "contract": cleaned_contract,
+                "pdf_url": store_pdf(filename, pdf_bytes),
+                "ttfb_ms": round(ttfb_ms, 1) if ttfb_ms is not None else None,
+                "render_ms": round(render_ms, 1),
+                "queue_wait_ms": ticket.timings()["queue_wait_ms"] if ticket is not None else 0.0,
+                "total_ms": round((time.perf_counter() - started) * 1000, 1)
+            })
+        except Overloaded as e:
+            # Headers are already sent, so the 503 travels in the event instead
+            yield _sse("error", {"error": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+
+    # X-Accel-Buffering stops nginx-style proxies from holding the stream back
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
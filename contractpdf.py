@@ -3,22 +3,30 @@ import re
 import json
 import uuid
 import requests
-from fpdf import FPDF
 from dotenv import load_dotenv
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, url_for
 from transformers import AutoTokenizer, AutoModel
 import torch
+from pdfrender import render_plain_pdf, wants_pdf_download, pdf_response
+from storage import store_pdf
+from clausecache import clause_cache, make_key
+from admission import llm_slot, Overloaded
+from bulkgen import BULK_MAX_RECORDS, BULK_SYNC_LIMIT, new_job, run_bulk, submit_bulk
+from jobs import job_store, job_progress
 
 load_dotenv()
 
 contract_bp = Blueprint("contract", __name__)
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
 HEADERS = {
     "Authorization": f"Bearer {OPENROUTER_API_KEY}",
     "Content-Type": "application/json"
 }
+REFINE_MODEL = "mistralai/mistral-7b-instruct:free"
+# Bump whenever the refinement prompt changes so cached clauses from the old prompt are not served
+REFINE_PROMPT_VERSION = "v1"
 
 # ====== InLegalBERT Setup ======
 embedding_model_id = "law-ai/InLegalBERT"
@@ -93,7 +101,7 @@ def retrieve_clause(query, contract_type):
     return clauses[best_index]
 
 # ====== Mistral Refinement ======
-def refine_clause_with_llm(clause, contract_type, city):
+def refine_payload(clause, contract_type, city):
     refinement_prompt = f"""**Legal Clause Optimization Task**
     
 As a senior Indian contract lawyer, improve this {contract_type} clause for maximum legal enforceability:
@@ -118,8 +126,8 @@ The city of jurisdiction is:
 **Example Output Structure:**
 'The Parties agree that [specific obligation] per Section 43 of IT Act, 2000. In event of breach, [remedy] through arbitration in [city] under Arbitration Act, 1996.'"""
 
-    payload = {
-        "model": "mistralai/mistral-7b-instruct:free",
+    return {
+        "model": REFINE_MODEL,
         "messages": [
             {"role": "system", "content": "You are a legal drafting expert specializing in Indian commercial contracts."},
             {"role": "user", "content": refinement_prompt}
@@ -127,10 +135,29 @@ The city of jurisdiction is:
         "temperature": 0.2,
         "max_tokens": 300
     }
-    
+
+def refine_key(clause, contract_type, city):
+    # The retrieved library clause stands in for scope: it is what varies per query
+    return make_key("openrouter-refine", REFINE_MODEL, REFINE_PROMPT_VERSION, contract_type, city, clause)
+
+def refined_text(response):
+    """Clause text from an OpenRouter completion response; raises on failure so nothing is cached."""
+    if response.status_code != 200:
+        raise Exception(f"OpenRouter returned {response.status_code}")
+    return response.json()['choices'][0]['message']['content'].strip()
+
+def generate_refined_clause(clause, contract_type, city):
+    """One fresh refinement from the LLM, bypassing the clause cache; raises on failure."""
+    with llm_slot():
+        response = requests.post(OPENROUTER_API_URL, headers=HEADERS, json=refine_payload(clause, contract_type, city), timeout=30)
+    return refined_text(response)
+
+def refine_clause_with_llm(clause, contract_type, city):
     try:
-        response = requests.post(OPENROUTER_API_URL, headers=HEADERS, json=payload, timeout=30)
-        return response.json()['choices'][0]['message']['content'].strip() if response.status_code == 200 else clause
+        return clause_cache.get(refine_key(clause, contract_type, city),
+                                lambda: generate_refined_clause(clause, contract_type, city))
+    except Overloaded:
+        raise  # shed with 503 rather than silently skipping refinement
     except Exception as e:
         print(f"Refinement Error: {str(e)}")
         return clause
@@ -159,52 +186,98 @@ def get_legal_template(data, clause):
     }
     return templates.get(T, "Invalid contract type.")
 
-# ====== PDF Export ======
-def save_as_pdf(content, filename="contract.pdf"):
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    pdf.set_font("Arial", size=11)
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(0, 10, "LEGAL CONTRACT DOCUMENT", 0, 1, 'C')
-    pdf.ln(10)
-    pdf.set_font("Arial", size=11)
-    for line in content.split("\n"):
-        pdf.multi_cell(0, 8, line)
-    pdf.output(filename)
+def jurisdiction_of(data):
+    # Older clients sent the misspelled "jusridiction"
+    return data.get("jurisdiction") or data.get("jusridiction") or "New Delhi"
+
+# ====== Request Handling (shared by the Flask view and asgi.py) ======
+def generation_inputs(data):
+    """(clause query, contract type, jurisdiction) of a generate request."""
+    return data.get("clause_query", ""), data.get("contract_type"), jurisdiction_of(data)
+
+def contract_filename(contract_type):
+    return f"{contract_type}_contract_{uuid.uuid4().hex[:8]}.pdf"
+
+def generated_response(contract, file_url, render_ms):
+    return {
+        "message": "Contract generated and uploaded.",
+        "contract": contract,
+        "pdf_url": file_url,
+        "render_ms": round(render_ms, 1)
+    }
 
 # ====== Flask Endpoint ======
 @contract_bp.route("/generate", methods=["POST"])
 def generate_contract():
     data = request.json
     try:
-        clause_query = data.get("clause_query", "")
-        contract_type = data.get("contract_type")
-        city = data.get("jusridiction", "New Delhi")
+        clause_query, contract_type, city = generation_inputs(data)
         clause = retrieve_clause(clause_query, contract_type)
         refined = refine_clause_with_llm(clause, contract_type, city)
         contract = get_legal_template(data, refined)
 
-        filename = "generated_contract.pdf"
-        save_as_pdf(contract, filename)
+        filename = contract_filename(contract_type)
+        pdf_bytes, render_ms = render_plain_pdf(contract)
+        if wants_pdf_download(request):
+            return pdf_response(pdf_bytes, filename, render_ms)
 
-        with open(filename, "rb") as f:
-            upload_res = requests.post("https://store1.gofile.io/uploadFile", files={"file": f})
+        return jsonify(generated_response(contract, store_pdf(filename, pdf_bytes), render_ms))
+    except Overloaded:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
 
-        if upload_res.status_code != 200:
-            raise Exception("Upload failed to GoFile")
+# ====== Bulk Generation ======
+def _bulk_clause_key(record):
+    return (record.get("contract_type"), jurisdiction_of(record), record.get("clause_query", ""))
 
-        res_json = upload_res.json()
-        if res_json.get("status") != "ok":
-            raise Exception("GoFile upload error")
+def _bulk_clause(record):
+    contract_type = record.get("contract_type")
+    clause = retrieve_clause(record.get("clause_query", ""), contract_type)
+    return refine_clause_with_llm(clause, contract_type, jurisdiction_of(record))
 
-        file_url = res_json["data"]["downloadPage"]
+@contract_bp.route("/bulk", methods=["POST"])
+def bulk_generate():
+    """
+    Generate many contracts that share terms but differ per party.
 
-        return jsonify({
-            "message": "Contract generated and uploaded.",
-            "contract": contract,
-            "pdf_url": file_url
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
\ No newline at end of file
+    Body: shared fields (contract_type, jurisdiction, clause_query, ...) plus "records",
+    a list of per-contract fields (party_a, party_b, duration, position, ...) that
+    override the shared ones. "output" is "manifest" (default) or "zip".
+    """
+    data = request.json or {}
+    records = data.get("records", [])
+    output = data.get("output", "manifest")
+    if not isinstance(records, list) or not records:
+        return jsonify({"error": "records must be a non-empty list"}), 400
+    if len(records) > BULK_MAX_RECORDS:
+        return jsonify({"error": f"At most {BULK_MAX_RECORDS} records per request"}), 400
+    if output not in ("manifest", "zip"):
+        return jsonify({"error": "output must be 'manifest' or 'zip'"}), 400
+
+    shared = {k: v for k, v in data.items() if k not in ("records", "output")}
+    merged = [{**shared, **record} for record in records]
+    required_fields = ["party_a", "party_b", "duration", "contract_type"]
+    for i, record in enumerate(merged):
+        missing = [field for field in required_fields if not record.get(field)]
+        if missing:
+            return jsonify({"error": f"Record {i} is missing {', '.join(missing)}"}), 400
+
+    job = new_job(len(merged))
+    args = (merged, _bulk_clause_key, _bulk_clause, get_legal_template, render_plain_pdf, output)
+    if len(merged) <= BULK_SYNC_LIMIT:
+        run_bulk(job, *args)
+        if job["status"] == "failed":
+            return jsonify(job_progress(job)), 500
+        return jsonify(job_progress(job))
+
+    submit_bulk(job, *args)
+    return jsonify({**job_progress(job), "status_url": url_for("contract.bulk_status", job_id=job["id"], _external=True)}), 202
+
+@contract_bp.route("/bulk/<job_id>", methods=["GET"])
+def bulk_status(job_id):
+    # Jobs live in the process that ran them; see jobs.py
+    job = job_store.get("bulk", job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    return jsonify(job_progress(job))
@@ -249,11 +249,15 @@ export default function PDFComplianceAnalyzer() {
                             className={`px-3 py-1 rounded-full text-xs font-semibold ${
                               compliance.Violates === "NO"
                                 ? "bg-green-100 dark:bg-green-900/30 text-green-800 dark:text-green-300"
+                                : compliance.Violates === "NOT_APPLICABLE"
+                                ? "bg-gray-100 dark:bg-gray-700/50 text-gray-700 dark:text-gray-300"
                                 : "bg-red-100 dark:bg-red-900/30 text-red-800 dark:text-red-300"
                             }`}
                           >
                             {compliance.Violates === "NO"
                               ? "Compliant"
+                              : compliance.Violates === "NOT_APPLICABLE"
+                              ? "No Relevant Rule"
                               : "Non-Compliant"}
                           </span>
                         </td>
@@ -0,0 +1,60 @@
+"""
+Registry of background jobs (bulk contract generation, batch analysis).
+
+Jobs are kept in the memory of the process that created them, so a status poll only
+finds a job when it reaches that same process: serve these endpoints from a single
+worker process (threads are fine) or route polls by job id. Finished jobs, with their
+results, are dropped JOB_TTL_HOURS after they finish.
+"""
+import os
+import time
+import uuid
+import threading
+
+# ====== Configuration ======
+JOB_TTL_HOURS = float(os.getenv("JOB_TTL_HOURS", "24"))
+
+_INTERNAL_FIELDS = ("kind", "queued_at", "finished_at")
+
+
+class JobStore:
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._jobs = {}  # job_id -> job dict
+
+    def create(self, kind, **fields):
+        """Register a queued job of `kind` with its progress counters in `fields`."""
+        job = {"id": uuid.uuid4().hex, "kind": kind, "status": "queued", **fields, "result": None, "error": None,
+               "queued_at": time.time(), "finished_at": None}
+        with self._lock:
+            self._evict()
+            self._jobs[job["id"]] = job
+        return job
+
+    def get(self, kind, job_id):
+        with self._lock:
+            self._evict()
+            job = self._jobs.get(job_id)
+        return job if job is not None and job["kind"] == kind else None
+
+    def _evict(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["finished_at"] is not None and now - job["finished_at"] > self.ttl_seconds]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+def finish(job, result=None, error=None):
+    job["result"] = result
+    job["error"] = error
+    job["status"] = "failed" if error is not None else "done"
+    job["finished_at"] = time.time()
+
+
+def job_progress(job):
+    return {k: v for k, v in job.items() if k not in _INTERNAL_FIELDS}
+
+
+job_store = JobStore(JOB_TTL_HOURS * 3600)
@@ -0,0 +1,413 @@
+import os
+import re
+import ast
+import json
+import time
+import asyncio
+import threading
+import requests
+from dotenv import load_dotenv
+from admission import llm_slot, allm_slot, Overloaded
+
+load_dotenv()
+
+# OpenRouter API for LLM reasoning (Mistral)
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+LLM_MODEL = "mistralai/mistral-7b-instruct:free"
+LLM_TIMEOUT = 60
+REPAIR_MAX_TOKENS = 200  # floor; a repair has to restate the whole fragment
+# Provider quota shared by every caller in the process; 0 disables pacing
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+
+headers = {
+    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+    "Content-Type": "application/json"
+}
+
+
+class RateLimiter:
+    """Spaces out call starts so the process stays under a requests-per-minute quota."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def reserve(self):
+        """Claim the next start time; returns the seconds to wait for it."""
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        return slot - now
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+llm_rate_limiter = RateLimiter(LLM_REQUESTS_PER_MINUTE)
+_async_client = None
+
+
+def get_async_client():
+    """Shared httpx.AsyncClient for the async server (asgi.py); created on first use inside its event loop."""
+    global _async_client
+    if _async_client is None:
+        import httpx
+        _async_client = httpx.AsyncClient(timeout=LLM_TIMEOUT, limits=httpx.Limits(max_connections=None, max_keepalive_connections=100))
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+# ====== Response Schemas ======
+# required: key -> expected type. defaults: keys the model may leave out when they would be empty.
+# any_of (optional): at least one of these keys must be present and non-empty.
+VIOLATION_SCHEMA = {"required": {"Violates": str, "Reason": str}, "defaults": {}}
+RISK_SCHEMA = {
+    "required": {},
+    "defaults": {"good_clauses": list, "risk_clauses": list, "recommendations": list},
+    "any_of": ("good_clauses", "risk_clauses", "recommendations"),
+}
+CLAUSES_SCHEMA = {"required": {"clauses": list}, "defaults": {}}
+COMBINED_SCHEMA = {"required": {"Violates": str, "Reason": str, "category": str}, "defaults": {}}
+
+
+class JsonObjectReader:
+    """
+    Finds the first top-level JSON object in a stream of text fragments.
+
+    Tracks brace depth outside of strings, so `complete` becomes True as soon as the
+    object closes and the caller can stop reading. Text before the object (fences,
+    preambles) is skipped; text after it is never read.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.complete = False
+
+    def feed(self, text):
+        for char in text:
+            if self.complete:
+                return
+            if self.depth == 0:
+                if char == "{":
+                    self.depth = 1
+                    self.parts.append(char)
+                continue
+            self.parts.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.complete = True
+
+    def text(self):
+        return "".join(self.parts)
+
+
+def validate(parsed, schema):
+    """Return `parsed` with defaults filled in if it matches `schema`, else None."""
+    if not isinstance(parsed, dict):
+        return None
+    for key, expected in schema["required"].items():
+        if not isinstance(parsed.get(key), expected):
+            return None
+    for key, expected in schema["defaults"].items():
+        value = parsed.setdefault(key, expected())
+        if not isinstance(value, expected):
+            return None
+    if "any_of" in schema and not any(parsed.get(key) for key in schema["any_of"]):
+        return None
+    return parsed
+
+
+def repair_json(text):
+    """
+    Best-effort local repair of a truncated or sloppy JSON object, without calling the model.
+
+    Handles output cut off by max_tokens (unterminated strings, missing closing brackets),
+    raw newlines, trailing commas, and Python-style literals.
+    """
+    text = re.sub(r"```(?:json)?", "", text).strip()
+    start = text.find("{")
+    if start < 0:
+        return None
+    # Raw newlines inside strings are the most common reason json.loads rejects model output
+    text = text[start:].replace("\n", " ").replace("\r", "")
+
+    # Close whatever the model left open, in reverse order
+    stack, in_string, escaped = [], False, False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = re.sub(r",\s*$", "", text.rstrip())
+    text += "".join(reversed(stack))
+    text = re.sub(r",\s*([}\]])", r"\1", text)
+
+    for loader in (json.loads, ast.literal_eval):
+        try:
+            return loader(text)
+        except Exception:
+            continue
+    return None
+
+
+def _payload(prompt, max_tokens, temperature, system_prompt):
+    return {
+        "model": LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "stream": True
+    }
+
+
+def _chunk_of(line):
+    """
+    (content fragment, finish_reason) carried by one SSE line of a streamed completion.
+
+    The fragment is None for lines without content and "" at [DONE]; finish_reason is set
+    on the chunk that ends the completion ("stop", or "length" when max_tokens cut it off).
+    """
+    if not line or not line.startswith("data: "):
+        return None, None
+    data = line[len("data: "):]
+    if data == "[DONE]":
+        return "", None
+    try:
+        choice = json.loads(data)["choices"][0]
+    except (ValueError, KeyError, IndexError):
+        return None, None
+    return (choice.get("delta") or {}).get("content") or None, choice.get("finish_reason")
+
+
+def _stream_content(prompt, max_tokens, temperature, system_prompt, outcome):
+    """
+    Yield content fragments from a streamed OpenRouter completion; the caller may stop early.
+
+    The completion's finish_reason is recorded in `outcome["finish_reason"]`.
+    """
+    payload = _payload(prompt, max_tokens, temperature, system_prompt)
+    # The slot is held until the stream ends or the caller closes it; pacing happens inside
+    # the slot so the fair queue, not lock order, decides who gets the provider quota
+    with llm_slot():
+        llm_rate_limiter.acquire()
+        with requests.post(OPENROUTER_API_URL, headers=headers, json=payload, stream=True, timeout=LLM_TIMEOUT) as response:
+            if response.status_code != 200:
+                print("LLM API Error:", response.status_code, response.text)
+                return
+            for line in response.iter_lines(decode_unicode=True):
+                content, finish_reason = _chunk_of(line)
+                if finish_reason:
+                    outcome["finish_reason"] = finish_reason
+                if content == "":
+                    return
+                if content:
+                    yield content
+
+
+async def _astream_content(prompt, max_tokens, temperature, system_prompt, outcome):
+    """Async counterpart of _stream_content over the shared httpx client."""
+    payload = _payload(prompt, max_tokens, temperature, system_prompt)
+    async with allm_slot():
+        await llm_rate_limiter.acquire_async()
+        async with get_async_client().stream("POST", OPENROUTER_API_URL, headers=headers, json=payload) as response:
+            if response.status_code != 200:
+                print("LLM API Error:", response.status_code, (await response.aread()).decode("utf-8", "replace"))
+                return
+            async for line in response.aiter_lines():
+                content, finish_reason = _chunk_of(line)
+                if finish_reason:
+                    outcome["finish_reason"] = finish_reason
+                if content == "":
+                    return
+                if content:
+                    yield content
+
+
+def _read_json_object(prompt, max_tokens, temperature, system_prompt):
+    """
+    Stream a completion until its first top-level JSON object closes.
+
+    Returns (object text, raw text, truncated), where truncated means max_tokens ended the
+    completion before the object closed.
+    """
+    reader = JsonObjectReader()
+    raw = []
+    outcome = {}
+    stream = _stream_content(prompt, max_tokens, temperature, system_prompt, outcome)
+    for fragment in stream:
+        raw.append(fragment)
+        reader.feed(fragment)
+        if reader.complete:
+            # Closing the generator closes the HTTP response, which stops generation upstream
+            stream.close()
+            break
+    return _read_result(reader, raw, outcome)
+
+
+async def _aread_json_object(prompt, max_tokens, temperature, system_prompt):
+    reader = JsonObjectReader()
+    raw = []
+    outcome = {}
+    stream = _astream_content(prompt, max_tokens, temperature, system_prompt, outcome)
+    try:
+        async for fragment in stream:
+            raw.append(fragment)
+            reader.feed(fragment)
+            if reader.complete:
+                break
+    finally:
+        await stream.aclose()
+    return _read_result(reader, raw, outcome)
+
+
+def _read_result(reader, raw, outcome):
+    raw_text = "".join(raw)
+    if reader.complete:
+        return reader.text(), raw_text, False
+    return raw_text, raw_text, outcome.get("finish_reason") == "length"
+
+
+def _parse_locally(candidate, schema):
+    try:
+        return validate(json.loads(candidate), schema)
+    except ValueError:
+        return validate(repair_json(candidate), schema)
+
+
+def call_llm_json(prompt, schema, max_tokens, temperature=0.3, system_prompt="You are a helpful Indian legal assistant."):
+    """
+    Ask the model for a JSON object and return it parsed and validated against `schema`.
+
+    The completion is streamed and the connection closed as soon as the top-level object
+    is complete, so trailing commentary is neither waited for nor generated. `max_tokens`
+    bounds the worst case. A reply cut off by `max_tokens` is retried once with twice the
+    budget and otherwise fails: repairing it would close its last string mid-sentence.
+    Other broken output is repaired locally first, then with a small repair prompt over
+    the fragment only.
+
+    Returns:
+        tuple: (parsed dict or None, raw response text or None if the call failed)
+    """
+    try:
+        candidate, raw_text, truncated = _read_json_object(prompt, max_tokens, temperature, system_prompt)
+        if truncated:
+            candidate, raw_text, truncated = _read_json_object(prompt, max_tokens * 2, temperature, system_prompt)
+    except Overloaded:
+        raise  # answered with 503 + Retry-After by the endpoint, not as a failed verdict
+    except Exception as e:
+        print("LLM API Error:", str(e))
+        return None, None
+    if not raw_text:
+        return None, None
+    if truncated:
+        print(f"LLM reply cut off at {max_tokens * 2} tokens")
+        return None, raw_text
+
+    parsed = _parse_locally(candidate, schema)
+    if parsed is None:
+        parsed = _repair_with_llm(raw_text, schema)
+    return parsed, raw_text
+
+
+async def acall_llm_json(prompt, schema, max_tokens, temperature=0.3, system_prompt="You are a helpful Indian legal assistant."):
+    """Async call_llm_json for the async server: same streaming, early stop, validation and repair."""
+    try:
+        candidate, raw_text, truncated = await _aread_json_object(prompt, max_tokens, temperature, system_prompt)
+        if truncated:
+            candidate, raw_text, truncated = await _aread_json_object(prompt, max_tokens * 2, temperature, system_prompt)
+    except Overloaded:
+        raise
+    except Exception as e:
+        print("LLM API Error:", str(e))
+        return None, None
+    if not raw_text:
+        return None, None
+    if truncated:
+        print(f"LLM reply cut off at {max_tokens * 2} tokens")
+        return None, raw_text
+
+    parsed = _parse_locally(candidate, schema)
+    if parsed is None:
+        parsed = await _arepair_with_llm(raw_text, schema)
+    return parsed, raw_text
+
+
+def _repair_prompt(broken, schema):
+    keys = list(schema["required"]) + list(schema["defaults"])
+    return (
+        f"Rewrite the following as one valid JSON object with the keys {', '.join(keys)}. "
+        f"Return only the JSON.\n\n{broken}"
+    )
+
+
+def _repair_budget(broken):
+    # About three characters per token, so the rewritten object fits
+    return max(REPAIR_MAX_TOKENS, len(broken) // 3)
+
+
+def _repair_with_llm(broken, schema):
+    try:
+        candidate, _, truncated = _read_json_object(_repair_prompt(broken, schema), _repair_budget(broken), 0.0, "You fix malformed JSON.")
+    except Overloaded:
+        raise
+    except Exception as e:
+        print("JSON repair error:", str(e))
+        return None
+    return None if truncated else validate(repair_json(candidate), schema)
+
+
+async def _arepair_with_llm(broken, schema):
+    try:
+        candidate, _, truncated = await _aread_json_object(_repair_prompt(broken, schema), _repair_budget(broken), 0.0, "You fix malformed JSON.")
+    except Overloaded:
+        raise
+    except Exception as e:
+        print("JSON repair error:", str(e))
+        return None
+    return None if truncated else validate(repair_json(candidate), schema)
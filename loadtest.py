@@ -0,0 +1,216 @@
+"""
+Concurrent-capacity load test: threaded Flask server vs the async (ASGI) server.
+
+The LLM is replaced by a local mock of the OpenRouter chat completions API with a fixed
+latency, so the test measures how many LLM-bound requests each server keeps in flight,
+not the provider's speed. Start the mock, then both servers pointed at it:
+
+    python loadtest.py mock --port 9000 --latency 2.0
+
+    export OPENROUTER_API_URL=http://127.0.0.1:9000/chat/completions
+    export LLM_MAX_IN_FLIGHT=64    # the provider's concurrency; leave the admission queue limits at their defaults
+    export TRUSTED_PROXY_HOPS=1    # the load test poses as a proxy so each simulated client gets its own fairness key
+    export VERDICT_LOG_ENABLED=0   # keep mock verdicts out of the gate's training log
+    export VERDICT_LOG_PATH=/tmp/loadtest_verdicts.jsonl    # and out of ./verdict_log.jsonl if logging is turned back on
+    gunicorn -w 1 -k gthread --threads 32 -b 127.0.0.1:5001 app:app    # threaded (or: PORT=5001 python app.py)
+    hypercorn -w 0 -b 127.0.0.1:5002 asgi:application                  # async
+
+    python loadtest.py run http://127.0.0.1:5001 http://127.0.0.1:5002 --concurrency 8 32 128 --large-clients 1
+
+Each target gets the same workload (POST /analysis/check_violation with --clauses clauses,
+or /analysis/upload with --pdf) at every concurrency level; with --large-clients, that many
+extra clients keep sending --large-clauses contracts meanwhile. The table reports the
+regular requests, so 503s there show load from the large contracts spilling onto others.
+With a mock latency of L seconds, a threaded server tops out near threads / L requests per
+second and queues the rest; the async server keeps going until LLM_MAX_IN_FLIGHT, CPU
+(embeddings, JSON handling) or the admission queue limits become the bound.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# One answer that satisfies every schema in llmjson (violation, risk, combined, clauses)
+MOCK_ANSWER = json.dumps({
+    "Violates": "NO",
+    "Reason": "Mock response.",
+    "category": "good",
+    "clauses": ["The Parties agree to keep all Confidential Information secret."],
+    "good_clauses": [{"clause": "The Parties agree to keep all Confidential Information secret.", "reason": "Mock response."}],
+    "risk_clauses": [],
+    "recommendations": [],
+})
+MOCK_CHUNK_SIZE = 16
+
+DEFAULT_CLAUSES = [
+    "The Employee shall not disclose any confidential information of the Company to third parties.",
+    "Either party may terminate this Agreement with thirty days written notice.",
+    "The Tenant shall pay a security deposit equal to ten months of rent.",
+    "All disputes shall be resolved by arbitration in New Delhi under the Arbitration and Conciliation Act, 1996.",
+]
+
+
+# ====== Mock OpenRouter ======
+class MockOpenRouter(BaseHTTPRequestHandler):
+    latency = 2.0
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.latency)
+        if payload.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(0, len(MOCK_ANSWER), MOCK_CHUNK_SIZE):
+                chunk = {"choices": [{"delta": {"content": MOCK_ANSWER[i:i + MOCK_CHUNK_SIZE]}}]}
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+            self._write_chunk("data: [DONE]\n\n")
+            self._write_chunk("")
+        else:
+            body = json.dumps({"choices": [{"message": {"content": MOCK_ANSWER}}]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        try:
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the server stopped reading once the JSON object closed
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_mock(port, latency):
+    MockOpenRouter.latency = latency
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockOpenRouter)
+    server.daemon_threads = True
+    print(f"Mock OpenRouter on http://127.0.0.1:{port}/chat/completions ({latency}s per completion)")
+    server.serve_forever()
+
+
+# ====== Load Runner ======
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def send(client, base_url, headers, clauses, pdf):
+    """Status code of one request (the exception name if it failed)."""
+    try:
+        if pdf:
+            response = await client.post(f"{base_url}/analysis/upload", headers=headers,
+                                         files={"file": ("contract.pdf", pdf, "application/pdf")})
+        else:
+            response = await client.post(f"{base_url}/analysis/check_violation", headers=headers,
+                                         json={"clauses": clauses})
+        return response.status_code
+    except Exception as e:
+        return type(e).__name__
+
+
+async def run_level(client, base_url, concurrency, total, clauses, pdf, large_clients=0, large_clauses=()):
+    """Send `total` requests with at most `concurrency` in flight; returns the level's summary."""
+    latencies, statuses, large_statuses = [], {}, {}
+    remaining = iter(range(total))
+    done = asyncio.Event()
+
+    async def worker(n):
+        headers = {"X-Forwarded-For": f"10.0.{n // 256}.{n % 256}"}
+        for _ in remaining:
+            started = time.perf_counter()
+            status = await send(client, base_url, headers, clauses, pdf)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+
+    async def large_worker(n):
+        headers = {"X-Forwarded-For": f"10.1.{n // 256}.{n % 256}"}
+        while not done.is_set():
+            status = await send(client, base_url, headers, large_clauses, None)
+            large_statuses[status] = large_statuses.get(status, 0) + 1
+            if status != 200:
+                await asyncio.sleep(1.0)
+
+    large = [asyncio.create_task(large_worker(n)) for n in range(large_clients)]
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*large)
+    return {
+        "concurrency": concurrency,
+        "ok": statuses.get(200, 0),
+        "errors": {str(k): v for k, v in statuses.items() if k != 200},
+        "large": {str(k): v for k, v in large_statuses.items()},
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "max": max(latencies) if latencies else None,
+    }
+
+
+def make_clauses(n):
+    """`n` distinct clauses, so none of them are deduplicated or served from a cache."""
+    return [f"{DEFAULT_CLAUSES[i % len(DEFAULT_CLAUSES)]} (Schedule {i + 1})" for i in range(n)]
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}"
+
+
+async def run(targets, levels, requests_per_level, clauses, pdf, timeout, large_clients=0, large_clauses=()):
+    import httpx
+    # Expire idle connections before the servers' own keep-alive timeouts close them under us
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=max(levels), keepalive_expiry=1.0)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        for base_url in targets:
+            print(f"\n{base_url}")
+            print(f"{'concurrency':>11} {'ok':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}  errors"
+                  + ("  [large contracts]" if large_clients else ""))
+            for concurrency in levels:
+                total = max(requests_per_level, concurrency)
+                level = await run_level(client, base_url.rstrip("/"), concurrency, total, clauses, pdf,
+                                        large_clients, large_clauses)
+                print(f"{level['concurrency']:>11} {level['ok']:>6} {level['throughput']:>8.2f} {_ms(level['p50']):>8} "
+                      f"{_ms(level['p95']):>8} {_ms(level['max']):>8}  {level['errors'] or ''}"
+                      + (f"  {level['large']}" if large_clients else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the threaded and async servers against a mock LLM.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    mock = commands.add_parser("mock", help="serve a mock OpenRouter chat completions API")
+    mock.add_argument("--port", type=int, default=9000)
+    mock.add_argument("--latency", type=float, default=2.0, help="seconds before each completion is returned")
+
+    runner = commands.add_parser("run", help="measure throughput and latency at rising concurrency")
+    runner.add_argument("targets", nargs="+", help="server base URLs, e.g. http://127.0.0.1:5001")
+    runner.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 128])
+    runner.add_argument("--requests", type=int, default=200, help="requests per concurrency level (at least one per client)")
+    runner.add_argument("--clauses", type=int, default=8, help="clauses per /check_violation request")
+    runner.add_argument("--large-clients", type=int, default=0, help="extra clients sending large contracts throughout")
+    runner.add_argument("--large-clauses", type=int, default=100, help="clauses per large-contract request")
+    runner.add_argument("--pdf", help="upload this PDF to /analysis/upload instead")
+    runner.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    if args.command == "mock":
+        serve_mock(args.port, args.latency)
+        sys.exit(0)
+    pdf = open(args.pdf, "rb").read() if args.pdf else None
+    asyncio.run(run(args.targets, args.concurrency, args.requests, make_clauses(args.clauses), pdf, args.timeout,
+                    args.large_clients, make_clauses(args.large_clauses)))
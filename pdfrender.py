@@ -0,0 +1,174 @@
+import io
+import os
+import copy
+import time
+import threading
+from fpdf import FPDF
+from fpdf.fonts import SubsetMap, TTFFont
+from fontTools import ttLib
+from fontTools import subset as ttsubset
+from flask import Response
+
+# ====== Font Setup ======
+# DejaVu files are looked up in FONT_DIR first, then next to this module, then the working directory.
+FONT_DIR = os.getenv("FONT_DIR", "")
+FONT_FAMILY = "DejaVu"
+FONT_FILES = {
+    "": "DejaVuSans.ttf",
+    "B": "DejaVuSans-Bold.ttf",
+}
+
+# Contract text is Latin-1 after clean_contract_output; keep the typographic characters it maps from too.
+FONT_REPERTOIRE = [*range(0x20, 0x7F), *range(0xA0, 0x100), *map(ord, "\u2018\u2019\u201c\u201d\u2013\u2014\u2026\u2022\u20b9")]
+
+_font_lock = threading.Lock()
+_font_cache = {}  # fontkey -> (parsed TTFFont, subset font bytes)
+
+
+def _font_path(fname):
+    for parent in (FONT_DIR, os.path.dirname(os.path.abspath(__file__)), "."):
+        if parent and os.path.exists(os.path.join(parent, fname)):
+            return os.path.join(parent, fname)
+    raise FileNotFoundError(f"TTF Font file not found: {fname}")
+
+
+def _load_font_bytes(fname):
+    options = ttsubset.Options()
+    options.notdef_outline = True
+    subsetter = ttsubset.Subsetter(options)
+    subsetter.populate(unicodes=FONT_REPERTOIRE)
+    font = ttLib.TTFont(_font_path(fname), recalcTimestamp=False)
+    subsetter.subset(font)
+    buf = io.BytesIO()
+    font.save(buf)
+    return buf.getvalue()
+
+
+def _add_cached_font(pdf, family, style, fname):
+    """
+    Register a TTF font on `pdf`, parsing and subsetting the font file only once per process.
+
+    The font is cut down to FONT_REPERTOIRE and parsed (cmap, glyph widths, descriptor)
+    on first use. Later documents get a shallow copy of that parse with their own subset
+    map and descriptor, over a lazily-loaded font object on the cached bytes, since fpdf
+    subsets that object in place when the document is written.
+    """
+    fontkey = f"{family.lower()}{style}"
+    with _font_lock:
+        if fontkey not in _font_cache:
+            data = _load_font_bytes(fname)
+            _font_cache[fontkey] = (TTFFont(pdf, io.BytesIO(data), fontkey, style), data)
+
+    proto, data = _font_cache[fontkey]
+    font = copy.copy(proto)
+    font.i = len(pdf.fonts) + 1
+    font.desc = copy.copy(proto.desc)
+    font.ttfont = ttLib.TTFont(io.BytesIO(data), recalcTimestamp=False, fontNumber=0, lazy=True)
+    font.missing_glyphs = []
+    identities = "\x00 \r\n"
+    if pdf.str_alias_nb_pages:
+        identities += "0123456789" + pdf.str_alias_nb_pages
+    font.subset = SubsetMap(font, [ord(char) for char in identities])
+    pdf.fonts[fontkey] = font
+
+
+def _elapsed_ms(started):
+    # Reported per response (X-Render-Time-Ms / render_ms); renders in pool workers have no shared counters
+    return (time.perf_counter() - started) * 1000
+
+
+# ====== Renderers ======
+def render_plain_pdf(content):
+    """
+    Render contract text with the built-in Arial layout used by the retrieval-based generator.
+
+    Returns:
+        tuple: (PDF bytes, render time in milliseconds)
+    """
+    started = time.perf_counter()
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Arial", 'B', 16)
+    pdf.cell(0, 10, "LEGAL CONTRACT DOCUMENT", 0, 1, 'C')
+    pdf.ln(10)
+    pdf.set_font("Arial", size=11)
+    for line in content.split("\n"):
+        pdf.multi_cell(0, 8, line)
+        pdf.set_x(pdf.l_margin)
+    data = bytes(pdf.output())
+    return data, _elapsed_ms(started)
+
+
+def render_contract_pdf(contract_content, contract_metadata=None):
+    """
+    Render a structured contract with the Unicode DejaVu layout used by the agent generator.
+
+    Returns:
+        tuple: (PDF bytes, render time in milliseconds)
+    """
+    started = time.perf_counter()
+    contract_metadata = contract_metadata or {}
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    for style, fname in FONT_FILES.items():
+        _add_cached_font(pdf, FONT_FAMILY, style, fname)
+
+    contract_type = contract_metadata.get("contract_type", "").upper()
+
+    # Title
+    pdf.set_font(FONT_FAMILY, "B", 16)
+    pdf.cell(0, 10, f"{contract_type} AGREEMENT", 0, 1, "C")
+    pdf.ln(5)
+
+    # Content
+    pdf.set_font(FONT_FAMILY, "", 12)
+    for line in contract_content.split("\n"):
+        if line.strip().upper() == f"{contract_type} AGREEMENT":
+            continue
+        elif line.strip().startswith("This") and "Agreement is made between" in line:
+            pdf.set_font(FONT_FAMILY, "B", 12)
+            pdf.multi_cell(0, 10, line)
+            pdf.ln(5)
+            pdf.set_font(FONT_FAMILY, "", 12)
+        elif line.strip().startswith("Signed:"):
+            pdf.ln(10)
+            pdf.set_font(FONT_FAMILY, "B", 12)
+            pdf.cell(0, 10, line, 0, 1)
+        elif line.strip() and line[0].isdigit() and ". " in line[:5]:
+            pdf.set_font(FONT_FAMILY, "B", 12)
+            pdf.multi_cell(0, 10, line)
+            pdf.set_font(FONT_FAMILY, "", 12)
+        elif line.strip().startswith("**") and line.strip().endswith("**"):
+            pdf.set_font(FONT_FAMILY, "B", 12)
+            pdf.multi_cell(0, 10, line.strip().replace("**", ""))
+            pdf.set_font(FONT_FAMILY, "", 12)
+        elif line.strip():
+            pdf.multi_cell(0, 10, line)
+        pdf.set_x(pdf.l_margin)
+
+    data = bytes(pdf.output())
+    return data, _elapsed_ms(started)
+
+
+# ====== HTTP Helpers ======
+def wants_pdf_download(req):
+    """True when the client asked for the PDF itself rather than a JSON body with a link."""
+    return req.args.get("download", "").lower() in ("1", "true", "yes") or \
+        req.accept_mimetypes.best == "application/pdf"
+
+
+def pdf_headers(pdf_bytes, filename, render_ms):
+    return {
+        "Content-Type": "application/pdf",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Content-Length": str(len(pdf_bytes)),
+        "X-Render-Time-Ms": f"{render_ms:.1f}",
+    }
+
+
+def pdf_response(pdf_bytes, filename, render_ms):
+    """Stream rendered PDF bytes as an attachment, without touching disk."""
+    return Response(pdf_bytes, headers=pdf_headers(pdf_bytes, filename, render_ms))
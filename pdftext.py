@@ -0,0 +1,20 @@
+import io
+import pdfplumber
+
+MAX_PAGES = 10
+
+
+def extract_pdf_text(data, max_pages=MAX_PAGES):
+    """
+    Text of the first `max_pages` pages of a PDF given as bytes. Returns (text, error).
+
+    Kept free of model imports so it can run in worker processes.
+    """
+    try:
+        with pdfplumber.open(io.BytesIO(data)) as pdf:
+            text = "\n".join([page.extract_text() or "" for page in pdf.pages[:max_pages]])
+        if not text.strip():
+            return None, "Extracted text is empty. Ensure the PDF is not scanned."
+        return text, None
+    except Exception as e:
+        return None, str(e)
@@ -0,0 +1,32 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# ====== Configuration ======
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+# Light modules the workers import up front; none of them load torch models
+PRELOAD_MODULES = ["pdfrender", "pdftext"]
+
+_pool_lock = threading.Lock()
+_process_pool = None
+
+
+def get_process_pool():
+    """
+    Process pool shared by CPU-bound jobs (PDF rendering, PDF text extraction).
+
+    Workers come from a fork server (or are spawned) rather than forked from the app process,
+    which holds torch models and threads that must not be copied. Submitted functions must be
+    top-level functions of modules in PRELOAD_MODULES so workers never import the models.
+    """
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                ctx = multiprocessing.get_context("forkserver")
+                ctx.set_forkserver_preload(PRELOAD_MODULES)
+            else:
+                ctx = multiprocessing.get_context("spawn")
+            _process_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=ctx)
+        return _process_pool
@@ -0,0 +1,175 @@
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import threading
+from difflib import SequenceMatcher
+
+# ====== Configuration ======
+ANALYSIS_STORE_DIR = os.getenv("ANALYSIS_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "analyses"))
+# Stored analyses hold the contract's clause text: drop them after this long, oldest first past the size cap
+ANALYSIS_MAX_AGE_HOURS = float(os.getenv("ANALYSIS_MAX_AGE_HOURS", "720"))
+ANALYSIS_STORE_MAX_MB = float(os.getenv("ANALYSIS_STORE_MAX_MB", "200"))
+EVICTION_INTERVAL_SECONDS = 60
+# Minimum similarity for a revised clause to count as a modification of an old one rather than an addition
+FUZZY_MATCH_THRESHOLD = float(os.getenv("FUZZY_MATCH_THRESHOLD", "0.75"))
+
+_ANALYSIS_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def normalise(clause):
+    """Clause text with case, punctuation and spacing differences removed."""
+    return " ".join(re.sub(r"[^\w\s]", "", clause.lower()).split())
+
+
+def clause_hash(clause):
+    return hashlib.sha1(normalise(clause).encode("utf-8")).hexdigest()
+
+
+def align(old_clauses, new_clauses, threshold=FUZZY_MATCH_THRESHOLD):
+    """
+    Align the clauses of a revision with those of the previous version.
+
+    Clauses whose normalised text is identical are "unchanged". The rest are paired by
+    difflib similarity, best pairs first and each old clause at most once; pairs at or
+    above `threshold` are "modified" and the remaining new clauses are "added".
+
+    Returns:
+        tuple: ({new clause: (status, old clause or None, similarity)}, [removed old clauses])
+    """
+    old_by_hash = {}
+    for clause in old_clauses:
+        old_by_hash.setdefault(clause_hash(clause), []).append(clause)
+
+    alignment = {}
+    matched_old = set()
+    unmatched_new = []
+    for clause in new_clauses:
+        candidates = old_by_hash.get(clause_hash(clause))
+        if candidates:
+            old = candidates.pop(0)
+            matched_old.add(old)
+            alignment[clause] = ("unchanged", old, 1.0)
+        else:
+            unmatched_new.append(clause)
+
+    remaining_old = [clause for clause in old_clauses if clause not in matched_old]
+    remaining_old_text = [normalise(clause) for clause in remaining_old]
+    pairs = []
+    for i, clause in enumerate(unmatched_new):
+        # SequenceMatcher caches its analysis of the second sequence, so keep the new clause there
+        matcher = SequenceMatcher(None, autojunk=False)
+        matcher.set_seq2(normalise(clause))
+        for j, old_text in enumerate(remaining_old_text):
+            matcher.set_seq1(old_text)
+            if matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold:
+                ratio = matcher.ratio()
+                if ratio >= threshold:
+                    pairs.append((ratio, i, j))
+
+    paired_new, paired_old = set(), set()
+    for ratio, i, j in sorted(pairs, reverse=True):
+        if i in paired_new or j in paired_old:
+            continue
+        paired_new.add(i)
+        paired_old.add(j)
+        alignment[unmatched_new[i]] = ("modified", remaining_old[j], round(ratio, 3))
+
+    for i, clause in enumerate(unmatched_new):
+        if i not in paired_new:
+            alignment[clause] = ("added", None, 0.0)
+    removed = [clause for j, clause in enumerate(remaining_old) if j not in paired_old]
+    return alignment, removed
+
+
+class AnalysisStore:
+    """
+    Stored per-clause results of past analyses, one JSON file per analysis id.
+
+    Each record is {"id", "previous_id", "created", "tasks", "clauses": [{"clause", "hash", "results"}]},
+    where "results" maps each task ("compliance", "risk") to that clause's verdict. Records
+    older than `max_age_seconds` are removed, then the oldest ones until the total is under
+    `max_bytes`; an expired id loads as unknown.
+    """
+
+    def __init__(self, root, max_age_seconds, max_bytes):
+        self.root = root
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._last_eviction = 0.0
+
+    def _path(self, analysis_id):
+        return os.path.join(self.root, f"{analysis_id}.json")
+
+    def save(self, previous_id, tasks, clause_results):
+        record = {
+            "id": uuid.uuid4().hex,
+            "previous_id": previous_id,
+            "created": time.time(),
+            "tasks": list(tasks),
+            "clauses": [{"clause": clause, "hash": clause_hash(clause), "results": results}
+                        for clause, results in clause_results.items()],
+        }
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(record["id"])
+        with self._lock:
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(record, f)
+            os.replace(f"{path}.tmp", path)
+        self.maybe_evict()
+        return record
+
+    def load(self, analysis_id):
+        """The stored record, or None for an unknown or malformed id."""
+        if not analysis_id or not _ANALYSIS_ID.match(analysis_id):
+            return None
+        try:
+            with open(self._path(analysis_id)) as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        # Eviction runs at most once a minute, so check the age here too
+        if time.time() - record["created"] > self.max_age_seconds:
+            return None
+        return record
+
+    def maybe_evict(self):
+        now = time.time()
+        if now - self._last_eviction < EVICTION_INTERVAL_SECONDS:
+            return
+        self._last_eviction = now
+        self.evict(now)
+
+    def evict(self, now=None):
+        """Apply the age and total-size limits; returns the number of records removed."""
+        now = now or time.time()
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.root) if os.path.isdir(self.root) else []:
+                if not (name.endswith(".json") and _ANALYSIS_ID.match(name[:-5])):
+                    continue
+                path = os.path.join(self.root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+            removed = 0
+            total = sum(size for _, size, _ in entries)
+            for mtime, size, path in sorted(entries):
+                if now - mtime <= self.max_age_seconds and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            return removed
+
+
+analysis_store = AnalysisStore(ANALYSIS_STORE_DIR, ANALYSIS_MAX_AGE_HOURS * 3600, ANALYSIS_STORE_MAX_MB * 1024 * 1024)
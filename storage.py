@@ -0,0 +1,198 @@
+import os
+import re
+import time
+import hashlib
+import mimetypes
+import threading
+from urllib.parse import quote
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from flask import Blueprint, jsonify, send_file, url_for, abort, has_request_context
+
+storage_bp = Blueprint("storage", __name__)
+
+# ====== Configuration ======
+# STORAGE_BACKEND=local keeps artifacts on this server only; =gofile additionally mirrors them to GoFile in the background.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+STORAGE_DIR = os.getenv("STORAGE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts"))
+STORAGE_MAX_AGE_HOURS = float(os.getenv("STORAGE_MAX_AGE_HOURS", "168"))
+STORAGE_MAX_MB = float(os.getenv("STORAGE_MAX_MB", "500"))
+# Base URL for artifact links made outside a request (agent tools, scripts); empty gives server-relative paths
+STORAGE_PUBLIC_URL = os.getenv("STORAGE_PUBLIC_URL", "")
+STORAGE_URL_PREFIX = "/files"
+EVICTION_INTERVAL_SECONDS = 60
+GOFILE_UPLOAD_URL = "https://store1.gofile.io/uploadFile"
+GOFILE_TIMEOUT = 30
+# GoFile links remembered for /files/<digest>; the oldest are forgotten first
+GOFILE_MAX_LINKS = int(os.getenv("GOFILE_MAX_LINKS", "10000"))
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+# ====== Local Content-Addressed Backend ======
+class LocalStorage:
+    """
+    Stores artifacts on disk under their SHA-256 digest, so identical PDFs are kept once.
+
+    Files live at <root>/<digest[:2]>/<digest>. Entries older than `max_age_seconds` are
+    removed, then the least recently stored ones until the total is under `max_bytes`.
+    """
+
+    def __init__(self, root, max_age_seconds, max_bytes):
+        self.root = root
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._last_eviction = 0.0
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        try:
+            # Refresh the timestamp so deduplicated hits count as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            # Not stored yet, or evicted by a concurrent evict()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        self.maybe_evict()
+        return digest
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def maybe_evict(self):
+        now = time.time()
+        if now - self._last_eviction < EVICTION_INTERVAL_SECONDS:
+            return
+        self._last_eviction = now
+        self.evict(now)
+
+    def evict(self, now=None):
+        """Apply the age and total-size limits; returns the number of files removed."""
+        now = now or time.time()
+        with self._lock:
+            entries = []
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    if not DIGEST_RE.match(name):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+
+            removed = 0
+            total = sum(size for _, size, _ in entries)
+            for mtime, size, path in sorted(entries):
+                if now - mtime <= self.max_age_seconds and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            return removed
+
+
+# ====== GoFile Mirror (optional) ======
+class GoFileMirror:
+    """Uploads stored artifacts to GoFile off the request path and remembers the resulting links."""
+
+    def __init__(self, max_workers=2, max_links=GOFILE_MAX_LINKS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gofile")
+        self._lock = threading.Lock()
+        self.max_links = max_links
+        self.links = OrderedDict()  # digest -> {"status": "pending" | "ok" | "failed", "url": ...}, oldest first
+
+    def submit(self, digest, filename, data):
+        with self._lock:
+            if digest in self.links and self.links[digest]["status"] != "failed":
+                return
+            self._set(digest, {"status": "pending", "url": None})
+        self._executor.submit(self._upload, digest, filename, data)
+
+    def _set(self, digest, entry):
+        self.links[digest] = entry
+        self.links.move_to_end(digest)
+        while len(self.links) > self.max_links:
+            self.links.popitem(last=False)
+
+    def _upload(self, digest, filename, data):
+        try:
+            mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            response = requests.post(GOFILE_UPLOAD_URL, files={"file": (filename, data, mimetype)}, timeout=GOFILE_TIMEOUT)
+            res_json = response.json()
+            if response.status_code != 200 or res_json.get("status") != "ok":
+                raise Exception("GoFile upload failed.")
+            result = {"status": "ok", "url": res_json["data"]["downloadPage"]}
+        except Exception as e:
+            print(f"GoFile mirror error for {digest}: {str(e)}")
+            result = {"status": "failed", "url": None}
+        with self._lock:
+            self._set(digest, result)
+
+    def status(self, digest):
+        with self._lock:
+            return self.links.get(digest)
+
+
+local_storage = LocalStorage(STORAGE_DIR, STORAGE_MAX_AGE_HOURS * 3600, STORAGE_MAX_MB * 1024 * 1024)
+gofile_mirror = GoFileMirror() if STORAGE_BACKEND == "gofile" else None
+
+
+def store_file(filename, data, base_url=None):
+    """
+    Store a generated artifact and return a download URL served by this app.
+
+    Inside a request the URL is absolute. Elsewhere it is built from `base_url`, else
+    STORAGE_PUBLIC_URL, else left relative to the server root.
+    """
+    digest = local_storage.put(data)
+    if gofile_mirror is not None:
+        gofile_mirror.submit(digest, filename, data)
+    if base_url is None and has_request_context():
+        return url_for("storage.download", digest=digest, filename=filename, _external=True)
+    return f"{(base_url or STORAGE_PUBLIC_URL).rstrip('/')}{STORAGE_URL_PREFIX}/{digest}/{quote(filename)}"
+
+
+def store_pdf(filename, pdf_bytes, base_url=None):
+    return store_file(filename, pdf_bytes, base_url)
+
+
+# ====== Flask Endpoints ======
+@storage_bp.route("/<digest>/<filename>", methods=["GET"])
+def download(digest, filename):
+    if not DIGEST_RE.match(digest) or not local_storage.exists(digest):
+        abort(404)
+    # conditional=True gives us If-None-Match / If-Modified-Since and Range handling
+    return send_file(
+        local_storage.path(digest),
+        mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        as_attachment=True,
+        download_name=filename,
+        conditional=True,
+        etag=digest,
+        max_age=int(STORAGE_MAX_AGE_HOURS * 3600),
+    )
+
+
+@storage_bp.route("/<digest>", methods=["GET"])
+def artifact_info(digest):
+    if not DIGEST_RE.match(digest) or not local_storage.exists(digest):
+        return jsonify({"error": "Artifact not found"}), 404
+    info = {"digest": digest, "size": os.path.getsize(local_storage.path(digest))}
+    if gofile_mirror is not None:
+        info["gofile"] = gofile_mirror.status(digest)
+    return jsonify(info)
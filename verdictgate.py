@@ -0,0 +1,232 @@
+"""
+Local verdict classifier that answers confident clauses without an LLM call.
+
+Every LLM verdict is appended to VERDICT_LOG_PATH (unless VERDICT_LOG_ENABLED=0). Train a gate from that log with
+
+    python verdictgate.py train --task compliance
+    python verdictgate.py train --task risk --target-accuracy 0.97
+    python verdictgate.py eval --task compliance
+
+which embeds the logged clauses and rules with InLegalBERT, fits a logistic
+regression over [clause, rule, clause*rule, similarity], calibrates it, and picks
+the lowest confidence threshold whose held-out accuracy meets the target. The
+analyzers load the saved gates at startup if present.
+"""
+import os
+import json
+import argparse
+import threading
+import numpy as np
+
+# ====== Configuration ======
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+VERDICT_LOG_PATH = os.getenv("VERDICT_LOG_PATH", os.path.join(_BASE_DIR, "verdict_log.jsonl"))
+# Turn off for load tests and other runs whose verdicts (e.g. from a mock LLM) must not become training data
+VERDICT_LOG_ENABLED = os.getenv("VERDICT_LOG_ENABLED", "1") == "1"
+GATE_MODEL_DIR = os.getenv("GATE_MODEL_DIR", os.path.join(_BASE_DIR, "gate_models"))
+GATE_ENABLED = os.getenv("GATE_ENABLED", "1") == "1"
+# Clauses with no rule above SIMILARITY_THRESHOLD are reported as NOT_APPLICABLE without asking the LLM
+SKIP_UNMATCHED_CLAUSES = os.getenv("SKIP_UNMATCHED_CLAUSES", "1") == "1"
+DEFAULT_TARGET_ACCURACY = 0.95
+# Labels with fewer logged verdicts are left out of training: the stratified split and 3-fold calibration need several per label
+MIN_LABEL_EXAMPLES = 10
+
+_log_lock = threading.Lock()
+_stats_lock = threading.Lock()
+gate_stats = {}  # task -> {"clauses", "llm_calls", "gated", "skipped"}
+
+
+def features(clause_embedding, rule_embedding, similarity):
+    clause_embedding = np.asarray(clause_embedding, dtype=np.float32)
+    rule_embedding = np.asarray(rule_embedding, dtype=np.float32)
+    return np.concatenate([clause_embedding, rule_embedding, clause_embedding * rule_embedding, [np.float32(similarity)]])
+
+
+def record_verdict(task, clause, rule_text, similarity, label):
+    """Append an LLM verdict to the training log."""
+    if not VERDICT_LOG_ENABLED:
+        return
+    entry = {"task": task, "clause": clause, "rule": rule_text, "similarity": float(similarity), "label": label}
+    try:
+        with _log_lock, open(VERDICT_LOG_PATH, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    except Exception as e:
+        print(f"Error logging verdict: {e}")
+
+
+def count(task, outcome):
+    """Count a clause outcome: "llm_calls", "gated" (classifier verdict) or "skipped" (no relevant rule)."""
+    with _stats_lock:
+        stats = gate_stats.setdefault(task, {"clauses": 0, "llm_calls": 0, "gated": 0, "skipped": 0})
+        stats["clauses"] += 1
+        stats[outcome] += 1
+
+
+def stats_report():
+    with _stats_lock:
+        return {
+            task: {**stats, "llm_calls_avoided": round((stats["gated"] + stats["skipped"]) / stats["clauses"], 3) if stats["clauses"] else 0.0}
+            for task, stats in gate_stats.items()
+        }
+
+
+# ====== Runtime Gate ======
+class VerdictGate:
+    def __init__(self, model, threshold, labels):
+        self.model = model
+        self.threshold = threshold
+        self.labels = labels
+
+    @classmethod
+    def load(cls, task):
+        """Load the trained gate for `task`, or None if there is none (or gating is disabled)."""
+        path = os.path.join(GATE_MODEL_DIR, f"{task}.joblib")
+        if not GATE_ENABLED or not os.path.exists(path):
+            return None
+        try:
+            import joblib
+            saved = joblib.load(path)
+            print(f"Loaded {task} verdict gate (threshold {saved['threshold']:.2f})")
+            return cls(saved["model"], saved["threshold"], saved["labels"])
+        except Exception as e:
+            print(f"Error loading {task} verdict gate: {e}")
+            return None
+
+    def predict(self, clause_embedding, rule_embedding, similarity):
+        """Return (label, confidence) when the classifier is confident enough, else None."""
+        probs = self.model.predict_proba([features(clause_embedding, rule_embedding, similarity)])[0]
+        best = int(np.argmax(probs))
+        if probs[best] < self.threshold:
+            return None
+        return str(self.model.classes_[best]), float(probs[best])
+
+
+# ====== Offline Training ======
+def _load_log(task):
+    rows = []
+    with open(VERDICT_LOG_PATH) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("task") == task and entry.get("label"):
+                rows.append(entry)
+    return rows
+
+
+def _embed_all(texts, batch_size=32):
+    import torch
+    from transformers import AutoTokenizer, AutoModel
+    tokenizer = AutoTokenizer.from_pretrained("law-ai/InLegalBERT")
+    model = AutoModel.from_pretrained("law-ai/InLegalBERT")
+    vectors = []
+    for i in range(0, len(texts), batch_size):
+        batch = texts[i:i + batch_size]
+        inputs = tokenizer(batch, return_tensors="pt", truncation=True, padding=True, max_length=512)
+        with torch.no_grad():
+            hidden = model(**inputs).last_hidden_state
+        # Mean over real tokens only, matching analysis.embed_batch
+        mask = inputs["attention_mask"].unsqueeze(-1).float()
+        vectors.extend(((hidden * mask).sum(dim=1) / mask.sum(dim=1)).numpy())
+    return vectors
+
+
+def _dataset(rows):
+    texts = sorted({row["clause"] for row in rows} | {row["rule"] for row in rows})
+    vectors = dict(zip(texts, _embed_all(texts)))
+    X = np.stack([features(vectors[row["clause"]], vectors[row["rule"]], row["similarity"]) for row in rows])
+    y = np.array([row["label"] for row in rows])
+    return X, y
+
+
+def pick_threshold(confidences, correct, target_accuracy):
+    """Lowest confidence threshold whose accepted predictions reach `target_accuracy`; 1.01 disables the gate."""
+    order = np.argsort(-confidences)
+    hits = np.cumsum(correct[order])
+    accuracy = hits / np.arange(1, len(order) + 1)
+    ok = np.nonzero(accuracy >= target_accuracy)[0]
+    if len(ok) == 0:
+        return 1.01
+    return float(confidences[order][ok[-1]])
+
+
+def train(task, target_accuracy, eval_fraction=0.2, seed=0):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.calibration import CalibratedClassifierCV
+    from sklearn.model_selection import train_test_split
+    import joblib
+
+    rows = _load_log(task)
+    counts = {}
+    for row in rows:
+        counts[row["label"]] = counts.get(row["label"], 0) + 1
+    rare = sorted(label for label, n in counts.items() if n < MIN_LABEL_EXAMPLES)
+    if rare:
+        # The gate never predicts a dropped label, so those clauses keep going to the LLM
+        print(f"Leaving out labels with fewer than {MIN_LABEL_EXAMPLES} verdicts: {', '.join(f'{l} ({counts[l]})' for l in rare)}")
+        rows = [row for row in rows if row["label"] not in rare]
+    labels = sorted({row["label"] for row in rows})
+    if len(rows) < 50 or len(labels) < 2:
+        print(f"Need at least 50 logged verdicts with 2+ labels for {task}; have {len(rows)} with labels {labels}")
+        return None
+
+    X, y = _dataset(rows)
+    try:
+        X_train, X_eval, y_train, y_eval = train_test_split(X, y, test_size=eval_fraction, random_state=seed, stratify=y)
+        base = LogisticRegression(max_iter=2000, class_weight="balanced")
+        model = CalibratedClassifierCV(base, method="sigmoid", cv=3).fit(X_train, y_train)
+    except ValueError as e:
+        print(f"Could not train the {task} gate: {e}")
+        return None
+
+    probs = model.predict_proba(X_eval)
+    predicted = model.classes_[probs.argmax(axis=1)]
+    confidences = probs.max(axis=1)
+    correct = (predicted == y_eval).astype(float)
+    threshold = pick_threshold(confidences, correct, target_accuracy)
+    accepted = confidences >= threshold
+
+    print(f"{task}: {len(rows)} verdicts, labels {labels}")
+    print(f"  overall eval accuracy:      {correct.mean():.3f}")
+    print(f"  confidence threshold:       {threshold:.3f}")
+    print(f"  LLM calls avoided (eval):   {accepted.mean():.3f}")
+    if accepted.any():
+        print(f"  accuracy on gated clauses:  {correct[accepted].mean():.3f}")
+
+    # Save the model the threshold was picked for; refitting on all data would leave the threshold uncalibrated
+    os.makedirs(GATE_MODEL_DIR, exist_ok=True)
+    path = os.path.join(GATE_MODEL_DIR, f"{task}.joblib")
+    joblib.dump({"model": model, "threshold": threshold, "labels": labels}, path)
+    print(f"Saved {path}")
+    return threshold
+
+
+def evaluate(task):
+    """Report how the saved gate does on the current log; verdicts logged since training are unseen data."""
+    gate = VerdictGate.load(task)
+    if gate is None:
+        print(f"No trained {task} gate in {GATE_MODEL_DIR}")
+        return
+    rows = _load_log(task)
+    X, y = _dataset(rows)
+    probs = gate.model.predict_proba(X)
+    predicted = gate.model.classes_[probs.argmax(axis=1)]
+    accepted = probs.max(axis=1) >= gate.threshold
+    print(f"{task}: {len(rows)} logged verdicts, threshold {gate.threshold:.3f}")
+    print(f"  LLM calls avoided:          {accepted.mean():.3f}")
+    if accepted.any():
+        print(f"  accuracy on gated clauses:  {(predicted[accepted] == y[accepted]).mean():.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train and evaluate the local verdict gate.")
+    parser.add_argument("command", choices=["train", "eval"])
+    parser.add_argument("--task", choices=["compliance", "risk"], required=True)
+    parser.add_argument("--target-accuracy", type=float, default=DEFAULT_TARGET_ACCURACY,
+                        help="required accuracy (agreement with the LLM) on clauses the gate answers")
+    args = parser.parse_args()
+    if args.command == "train":
+        train(args.task, args.target_accuracy)
+    else:
+        evaluate(args.task)
@@ -0,0 +1,50 @@
+"""
+Offline pre-warm for the clause generation cache.
+
+Fills every variant slot for the known contract types across the busiest cities, so
+live /contract/generate requests for those combinations are served from cache.
+
+    python warmcache.py --backend agi --cities Mumbai Bengaluru
+    python warmcache.py --backend pdf --types employment lease
+"""
+import argparse
+from clausecache import clause_cache
+
+CONTRACT_TYPES = ["nda", "employment", "contractor", "sla", "partnership", "sales", "lease", "mou", "noncompete"]
+TOP_CITIES = ["New Delhi", "Mumbai", "Bengaluru", "Hyderabad", "Chennai", "Kolkata", "Pune", "Ahmedabad"]
+
+
+def warm_agi(contract_types, cities):
+    # Imported lazily: each generator module loads its models on import
+    from contractagi import generate_clause
+    for contract_type in contract_types:
+        for city in cities:
+            for _ in range(clause_cache.variants):
+                generate_clause.invoke({"contract_type": contract_type, "jurisdiction": city, "scope": ""})
+            print(f"Warmed {contract_type} / {city}")
+
+
+def warm_pdf(contract_types, cities):
+    from contractpdf import clause_library, refine_clause_with_llm
+    for contract_type in contract_types:
+        for city in cities:
+            for clause in clause_library.get(contract_type, []):
+                for _ in range(clause_cache.variants):
+                    refine_clause_with_llm(clause, contract_type, city)
+            print(f"Warmed {contract_type} / {city}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-warm the clause generation cache.")
+    parser.add_argument("--backend", choices=["agi", "pdf"], default="pdf",
+                        help="agi: Groq clause generator (contractagi.py); pdf: OpenRouter refinement (contractpdf.py)")
+    parser.add_argument("--types", nargs="+", default=CONTRACT_TYPES)
+    parser.add_argument("--cities", nargs="+", default=TOP_CITIES)
+    args = parser.parse_args()
+
+    if args.backend == "agi":
+        warm_agi(args.types, args.cities)
+    else:
+        warm_pdf(args.types, args.cities)
+    clause_cache.save()
+    print(f"Done: {clause_cache.stats}")